@@ -0,0 +1,226 @@
+"""
+End-to-end latency benchmark: replay recorded utterances through the real recording and
+transcription pipeline and measure how long it takes until the last character is typed.
+
+Every WAV file is replayed through a ReplaySource into an AudioEngine and recorded by a
+ResultThread in voice activity detection mode, so VAD endpointing, transcription and
+post-processing run exactly as in the application. Typed text goes to a fake input
+simulator that only records when it received each piece of text.
+
+For every utterance the latency from the end of speech (the moment the last speech sample
+reached the pipeline) to the last typed character is reported. The summary contains the
+latency percentiles, the per-stage latencies from the tracer, the throughput in seconds of
+audio per second, and the peak memory use. Output is a single JSON object.
+
+With --speed fast the audio is delivered faster than real time, so the stages measured
+from audio timestamps (speech_start and endpoint) would be meaningless or negative; they
+are left out of the summary in that mode.
+
+Without a corpus, synthetic speech-like utterances are used, so the benchmark runs offline
+with the stub engine and no model.
+
+Usage:
+    python benchmarks/bench_e2e_latency.py [--corpus DIR_OR_WAV ...] [--engine stub]
+                                           [--speed realtime|fast] [--output FILE.json]
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from audio_engine import AudioEngine
+from audio_source import ReplaySource
+from bench_upload_codecs import synthetic_speech
+from engines import create_engine
+from result_thread import ResultThread
+from tracing import tracer
+from utils import ConfigManager
+
+# Level below which audio counts as silence when locating the end of speech in a file
+SPEECH_LEVEL = 0.02
+
+# Tracer stages that start at a timestamp derived from the position in the audio, which
+# only matches the wall clock when the audio is replayed in real time
+AUDIO_CLOCK_STAGES = ('speech_start', 'endpoint')
+
+
+class FakeInputSimulator:
+    """Input simulator sink that records what would be typed and when."""
+
+    def __init__(self):
+        self.text = ''
+        self.last_output_time = None
+
+    def typewrite(self, text):
+        self.text += text
+        if text:
+            self.last_output_time = time.time()
+
+
+class TimedReplaySource(ReplaySource):
+    """ReplaySource that records the wall-clock time at which the end of speech was delivered."""
+
+    def __init__(self, audio, sample_rate, speech_end, realtime=True):
+        super().__init__(audio, sample_rate, realtime=realtime)
+        self.speech_end = speech_end
+        self.speech_end_time = None
+
+    def start(self, callback, finished_callback=None):
+        def timed_callback(block):
+            callback(block)
+            if self.speech_end_time is None and self._position >= self.speech_end:
+                self.speech_end_time = time.time()
+        super().start(timed_callback, finished_callback)
+
+
+def find_speech_end(audio):
+    """Return the sample index just after the last sample above SPEECH_LEVEL."""
+    level = np.abs(audio.astype(np.float32) / (32768.0 if audio.dtype == np.int16 else 1.0))
+    loud = np.flatnonzero(level > SPEECH_LEVEL)
+    return int(loud[-1]) + 1 if len(loud) else len(audio)
+
+
+def load_corpus(paths, sample_rate, synthetic_count):
+    """Load the WAV files given as files or directories, or generate synthetic utterances."""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.wav'))) if os.path.isdir(path) else [path])
+
+    if files:
+        return [(os.path.basename(file), ReplaySource.from_file(file, sample_rate, trailing_silence=0).audio)
+                for file in files]
+
+    corpus = []
+    for index in range(synthetic_count):
+        # Shorter than the first pause in the synthetic signal, which would end the recording
+        duration = 1.0 + 0.6 * (index % 3)
+        speech = (synthetic_speech(duration, sample_rate) * 32767).astype(np.int16)
+        # Lead-in silence so that recording starts before the speech, as after a key press
+        audio = np.concatenate((np.zeros(sample_rate // 2, dtype=np.int16), speech))
+        corpus.append((f'synthetic_{index}_{duration:.1f}s', audio))
+    return corpus
+
+
+def configure(args):
+    """Set up the configuration for a reproducible run."""
+    ConfigManager.initialize()
+    for value, keys in ((args.engine, ('model_options', 'engine')),
+                        (False, ('model_options', 'common', 'streaming')),
+                        (args.stream_output, ('post_processing', 'stream_output')),
+                        ('voice_activity_detection', ('recording_options', 'recording_mode')),
+                        (args.sample_rate, ('recording_options', 'sample_rate')),
+                        ('int16', ('recording_options', 'capture_mode')),
+                        (0, ('recording_options', 'pre_roll_duration')),
+                        (False, ('misc', 'print_to_terminal')),
+                        (False, ('misc', 'noise_on_completion'))):
+        ConfigManager.set_config_value(value, *keys)
+    ConfigManager.apply_changes()
+    tracer.configure(True, 65536)
+
+
+def run_utterance(engine, name, audio, sample_rate, realtime, timeout):
+    """Replay one utterance through the pipeline and return its measurements."""
+    speech_end = find_speech_end(audio)
+    source = TimedReplaySource(audio, sample_rate, speech_end, realtime=realtime)
+    audio_engine = AudioEngine(source=source)
+    sink = FakeInputSimulator()
+
+    # The output is called in the result thread, so no Qt event loop is needed
+    result_thread = ResultThread(engine, audio_engine, output=sink.typewrite)
+
+    audio_engine.start()
+    start_time = time.time()
+    worker = threading.Thread(target=result_thread.run, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    timed_out = worker.is_alive()
+    if timed_out:
+        result_thread.stop_recording()
+        worker.join()
+    wall_time = time.time() - start_time
+    audio_engine.stop()
+
+    latency = None
+    if source.speech_end_time is not None and sink.last_output_time is not None:
+        latency = sink.last_output_time - source.speech_end_time
+    return {
+        'name': name,
+        'audio_duration': len(audio) / sample_rate,
+        'speech_duration': speech_end / sample_rate,
+        'wall_time': wall_time,
+        'latency': latency,
+        'timed_out': timed_out,
+        'text_length': len(sink.text),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', nargs='*', default=[], help='WAV files or directories of WAV files.')
+    parser.add_argument('--synthetic', type=int, default=3, help='Number of synthetic utterances without a corpus.')
+    parser.add_argument('--engine', default='stub', help='Transcription engine, e.g. stub or faster_whisper.')
+    parser.add_argument('--speed', choices=['realtime', 'fast'], default='realtime',
+                        help='Replay at real-time speed for latency, or as fast as possible for throughput.')
+    parser.add_argument('--stream-output', action='store_true', help='Type segments as soon as they are transcribed.')
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--timeout', type=float, default=120.0, help='Maximum seconds per utterance.')
+    parser.add_argument('--output', help='Write the JSON result to this file instead of stdout.')
+    args = parser.parse_args()
+
+    configure(args)
+    corpus = load_corpus(args.corpus, args.sample_rate, args.synthetic)
+
+    engine = create_engine()
+    engine.load()
+    engine.warm_up()
+
+    tracemalloc.start()
+    started = time.time()
+    utterances = [run_utterance(engine, name, audio, args.sample_rate, args.speed == 'realtime', args.timeout)
+                  for name, audio in corpus]
+    total_wall_time = time.time() - started
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.close()
+
+    latencies = [utterance['latency'] for utterance in utterances if utterance['latency'] is not None]
+    stages = {stage: {'count': count, 'p50': values[0], 'p95': values[1]}
+              for stage, (count, _, values) in tracer.quantiles((0.5, 0.95)).items()
+              if args.speed == 'realtime' or stage not in AUDIO_CLOCK_STAGES}
+    result = {
+        'engine': args.engine,
+        'speed': args.speed,
+        'stream_output': args.stream_output,
+        'utterances': utterances,
+        'summary': {
+            'count': len(utterances),
+            'failed': len(utterances) - len(latencies),
+            'latency_p50': float(np.percentile(latencies, 50)) if latencies else None,
+            'latency_p95': float(np.percentile(latencies, 95)) if latencies else None,
+            'latency_max': max(latencies) if latencies else None,
+            'throughput': sum(utterance['audio_duration'] for utterance in utterances) / total_wall_time,
+            'peak_traced_memory_mb': peak_traced / 2 ** 20,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'stages': stages,
+        },
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    return 1 if result['summary']['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
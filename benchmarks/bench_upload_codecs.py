@@ -0,0 +1,74 @@
+"""
+Compare upload formats for API transcription: encode time against upload size.
+
+For every format the audio is encoded in memory several times and the median encode time
+and the encoded size are reported, together with the estimated upload time at the given
+uplink bandwidth. Results are printed as one JSON object per line.
+
+Usage:
+    python benchmarks/bench_upload_codecs.py [--input FILE.wav] [--uplink-kbps 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from audio_encoding import encode_audio
+
+
+def synthetic_speech(duration, sample_rate):
+    """Generate speech-like audio: harmonic bursts with syllable-rate modulation and pauses."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.25 * t) > -0.5)
+    audio = 0.3 * voiced * envelope + 0.003 * rng.standard_normal(len(t))
+    return np.clip(audio, -1, 1).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', help='Mono or stereo audio file to encode. Defaults to synthetic speech.')
+    parser.add_argument('--duration', type=float, default=30.0, help='Duration of the synthetic audio in seconds.')
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--bitrate', type=int, default=24000, help='Opus bitrate in bits per second.')
+    parser.add_argument('--uplink-kbps', type=float, default=1000.0, help='Uplink bandwidth used to estimate upload time.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.input:
+        from audio_source import ReplaySource
+        audio = ReplaySource.from_file(args.input, args.sample_rate, dtype=np.int16).audio
+    else:
+        audio = (synthetic_speech(args.duration, args.sample_rate) * 32767).astype(np.int16)
+    duration = len(audio) / args.sample_rate
+
+    for upload_format in ('wav', 'flac', 'opus'):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            file_name, byte_io, _ = encode_audio(audio, args.sample_rate, upload_format, args.bitrate)
+            timings.append(time.perf_counter() - start)
+
+        size = len(byte_io.getbuffer())
+        encode_time = statistics.median(timings)
+        upload_time = size * 8 / (args.uplink_kbps * 1000)
+        print(json.dumps({
+            'format': upload_format,
+            'file_name': file_name,
+            'audio_seconds': round(duration, 3),
+            'bytes': size,
+            'encode_ms': round(encode_time * 1000, 3),
+            'upload_ms': round(upload_time * 1000, 3),
+            'total_ms': round((encode_time + upload_time) * 1000, 3),
+        }))
+
+
+if __name__ == '__main__':
+    main()
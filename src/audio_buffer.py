@@ -0,0 +1,134 @@
+import numpy as np
+
+
+class AudioBuffer:
+    """
+    A growable, preallocated buffer for captured audio samples.
+
+    Samples are written with block copies into one contiguous NumPy array whose capacity
+    doubles whenever it runs out, so a recording never turns into a list of Python ints.
+    Frames are read back as zero-copy views into the underlying array.
+
+    The buffer is safe for a single writer (the audio callback) and a single reader (the
+    recording loop): the size is only advanced after the samples have been copied, and a
+    view taken before the array grows keeps referencing the old, still valid, storage.
+    """
+
+    def __init__(self, initial_capacity=16000 * 30, dtype=np.int16):
+        """
+        Initialize the AudioBuffer.
+
+        :param initial_capacity: Number of samples to preallocate
+        :param dtype: NumPy dtype of the stored samples
+        """
+        self._data = np.empty(max(1, int(initial_capacity)), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def _reserve(self, count):
+        """Make sure there is room for `count` more samples, growing geometrically."""
+        required = self._size + count
+        if required <= len(self._data):
+            return
+        capacity = max(required, 2 * len(self._data))
+        data = np.empty(capacity, dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def append(self, samples):
+        """
+        Append samples to the buffer with a single block copy.
+
+        :param samples: 1-D array of samples
+        :return: View of the region that was written
+        """
+        count = len(samples)
+        self._reserve(count)
+        start = self._size
+        self._data[start:start + count] = samples
+        self._size = start + count
+        return self._data[start:self._size]
+
+    def view(self, start=0, end=None):
+        """
+        Return a zero-copy view of the buffered samples.
+
+        :param start: First sample index
+        :param end: One past the last sample index, defaults to the current size
+        :return: NumPy view into the buffer
+        """
+        end = self._size if end is None else min(end, self._size)
+        return self._data[start:end]
+
+    def clear(self):
+        """Discard the buffered samples while keeping the allocated capacity."""
+        self._size = 0
+
+
+class RingBuffer:
+    """
+    A fixed-size circular buffer that keeps only the most recent audio samples.
+
+    Used to hold a short pre-roll of audio captured before a recording starts.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        """
+        Initialize the RingBuffer.
+
+        :param capacity: Maximum number of samples to keep
+        :param dtype: NumPy dtype of the stored samples
+        """
+        self._data = np.zeros(max(0, int(capacity)), dtype=dtype)
+        self._write_index = 0
+        self._filled = 0
+
+    def __len__(self):
+        return self._filled
+
+    def write(self, samples):
+        """
+        Write samples into the buffer, overwriting the oldest ones when full.
+
+        :param samples: 1-D array of samples
+        """
+        capacity = len(self._data)
+        count = len(samples)
+        if capacity == 0 or count == 0:
+            return
+        if count >= capacity:
+            self._data[:] = samples[-capacity:]
+            self._write_index = 0
+            self._filled = capacity
+            return
+
+        end = self._write_index + count
+        if end <= capacity:
+            self._data[self._write_index:end] = samples
+        else:
+            split = capacity - self._write_index
+            self._data[self._write_index:] = samples[:split]
+            self._data[:count - split] = samples[split:]
+        self._write_index = end % capacity
+        self._filled = min(capacity, self._filled + count)
+
+    def read(self):
+        """
+        Return the buffered samples in chronological order.
+
+        :return: New NumPy array holding a copy of the buffered samples
+        """
+        if self._filled < len(self._data):
+            return self._data[:self._filled].copy()
+        return np.concatenate((self._data[self._write_index:], self._data[:self._write_index]))
+
+    def clear(self):
+        """Discard all buffered samples."""
+        self._write_index = 0
+        self._filled = 0
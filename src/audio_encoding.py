@@ -0,0 +1,57 @@
+import io
+import numpy as np
+import soundfile as sf
+
+# Sample rates supported by the Opus encoder
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def _to_int16(audio_data):
+    if audio_data.dtype == np.int16:
+        return audio_data
+    return (np.clip(audio_data, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def _encode_opus(audio_data, sample_rate, bitrate, byte_io):
+    """Encode audio as Opus in an Ogg container using PyAV."""
+    import av
+
+    container = av.open(byte_io, mode='w', format='ogg')
+    stream = container.add_stream('libopus', rate=sample_rate)
+    stream.codec_context.layout = 'mono'
+    stream.codec_context.bit_rate = bitrate
+
+    frame = av.AudioFrame.from_ndarray(_to_int16(audio_data)[None, :], format='s16', layout='mono')
+    frame.sample_rate = sample_rate
+    for packet in stream.encode(frame):
+        container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+
+
+def encode_audio(audio_data, sample_rate, upload_format='wav', bitrate=24000):
+    """
+    Encode audio data in memory for uploading.
+
+    :param audio_data: 1-D int16 or float32 array
+    :param sample_rate: Sample rate of the audio in Hz
+    :param upload_format: 'wav' (uncompressed), 'flac' (lossless) or 'opus' (lossy, in Ogg)
+    :param bitrate: Target bitrate in bits per second for Opus
+    :return: Tuple of file name, BytesIO positioned at the start, and MIME type
+    """
+    byte_io = io.BytesIO()
+
+    if upload_format == 'opus' and sample_rate in OPUS_SAMPLE_RATES:
+        _encode_opus(audio_data, sample_rate, bitrate, byte_io)
+        file_name, mime_type = 'audio.ogg', 'audio/ogg'
+    elif upload_format in ('flac', 'opus'):
+        # Opus only supports a few sample rates; fall back to lossless compression otherwise
+        sf.write(byte_io, _to_int16(audio_data), sample_rate, format='flac', subtype='PCM_16')
+        file_name, mime_type = 'audio.flac', 'audio/flac'
+    else:
+        sf.write(byte_io, audio_data, sample_rate, format='wav')
+        file_name, mime_type = 'audio.wav', 'audio/wav'
+
+    byte_io.seek(0)
+    return file_name, byte_io, mime_type
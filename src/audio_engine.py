@@ -0,0 +1,162 @@
+import threading
+import time
+
+from audio_buffer import RingBuffer
+from audio_source import create_audio_source
+from tracing import tracer
+from utils import ConfigManager
+
+
+class AudioEngine:
+    """
+    A long-lived audio capture service shared by all recording sessions.
+
+    The engine opens the input device once and keeps the stream running. Every block the
+    device delivers is handed to the currently attached session, if any. Attaching and
+    detaching a session only swaps a reference under a short lock, so a new recording starts
+    receiving frames on the very next block instead of paying for a device open.
+
+    When a pre-roll duration is configured, the engine also keeps the most recent audio in
+    a ring buffer and hands it to each session as it attaches, so speech that started just
+    before the recording was triggered is not lost.
+
+    Audio comes from an AudioSource: the microphone by default, or a replayed file for
+    running without audio hardware. In the 'native_float32' capture mode the microphone is
+    opened at its native sample rate in float32 and resampled within WhisperWriter, and
+    sessions receive float32 samples.
+
+    A watchdog thread reopens the source when the device disappears or the stream stops
+    unexpectedly.
+    """
+
+    FRAME_DURATION_MS = 30
+    REOPEN_INTERVAL = 1.0
+
+    def __init__(self, source=None):
+        """
+        Initialize the AudioEngine from the recording options in the configuration.
+
+        :param source: AudioSource to capture from. If not given, it is created from the
+                       configuration.
+        """
+        recording_options = ConfigManager.get_config_section('recording_options')
+        if source is None:
+            source = create_audio_source(recording_options.get('sample_rate') or 16000)
+        self.source = source
+        self.sample_rate = source.sample_rate
+        self.dtype = source.dtype
+        self.frame_size = int(self.sample_rate * (self.FRAME_DURATION_MS / 1000.0))
+
+        pre_roll_ms = recording_options.get('pre_roll_duration') or 0
+        self._pre_roll = RingBuffer(int(self.sample_rate * pre_roll_ms / 1000), dtype=self.dtype) if pre_roll_ms > 0 else None
+        self._last_block_time = None
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stream_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reopen_event = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        """Open the input stream and start the watchdog thread."""
+        if self._watchdog and self._watchdog.is_alive():
+            return
+        self._stop_event.clear()
+        self._open_stream()
+        self._watchdog = threading.Thread(target=self._watchdog_loop, daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Stop the watchdog thread and close the input stream."""
+        self._stop_event.set()
+        self._reopen_event.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=2)
+            self._watchdog = None
+        self._close_stream()
+        self._session = None
+
+    def attach(self, session, pre_roll=True):
+        """
+        Attach a recording session.
+
+        :param session: Callable receiving a 1-D NumPy array of samples for every block
+        :param pre_roll: Whether to deliver the buffered pre-roll audio first
+        :return: Wall-clock timestamp (as returned by time.time()) of the first sample
+                 the session receives
+        """
+        with self._session_lock:
+            start_time = self._last_block_time or time.time()
+            if pre_roll and self._pre_roll is not None and len(self._pre_roll) and self._last_block_time:
+                samples = self._pre_roll.read()
+                session(samples)
+                start_time = self._last_block_time - len(samples) / self.sample_rate
+            self._session = session
+        self.source.session_attached()
+        return start_time
+
+    def detach(self, session=None):
+        """
+        Detach the current recording session.
+
+        :param session: If given, only detach when it is still the attached session
+        """
+        with self._session_lock:
+            if session is None or self._session is session:
+                self._session = None
+                self.source.session_detached()
+
+    @property
+    def is_active(self):
+        """Whether the audio source is currently open and running."""
+        return self.source.active
+
+    def _audio_callback(self, samples):
+        with self._session_lock:
+            self._last_block_time = time.time()
+            if self._pre_roll is not None:
+                self._pre_roll.write(samples)
+            session = self._session
+            if session is not None:
+                session(samples)
+
+    def _on_stream_finished(self):
+        if not self._stop_event.is_set():
+            self._reopen_event.set()
+
+    def _open_stream(self):
+        """Open and start the input stream, returning True on success."""
+        with self._stream_lock:
+            # Audio buffered from a previous stream is stale and must not become pre-roll
+            with self._session_lock:
+                self._last_block_time = None
+                if self._pre_roll is not None:
+                    self._pre_roll.clear()
+            try:
+                with tracer.span('stream_open'):
+                    self.source.start(self._audio_callback, self._on_stream_finished)
+            except Exception as e:
+                ConfigManager.console_print(f'Error opening audio stream: {e}')
+                self.source.stop()
+                return False
+            return True
+
+    def _close_stream(self):
+        with self._stream_lock:
+            self.source.stop()
+
+    def _watchdog_loop(self):
+        """Reopen the stream whenever it stops while the engine is running."""
+        while not self._stop_event.is_set():
+            self._reopen_event.wait(timeout=self.REOPEN_INTERVAL)
+            self._reopen_event.clear()
+            if self._stop_event.is_set():
+                break
+            if self.is_active:
+                continue
+
+            ConfigManager.console_print('Audio stream is not active. Reopening device...')
+            self._close_stream()
+            if not self._open_stream():
+                time.sleep(self.REOPEN_INTERVAL)
@@ -0,0 +1,165 @@
+import math
+import numpy as np
+
+
+def compact_silence(audio_data, speech_flags, frame_size, max_pause_frames, padding_frames=0):
+    """
+    Strip leading and trailing silence and shorten long pauses using per-frame VAD decisions.
+
+    Speech frames are first padded on both sides so that soft word onsets and endings that the
+    VAD classified as silence are kept. Silence before the first and after the last speech frame
+    is removed, and every remaining pause is shortened to at most `max_pause_frames` frames,
+    keeping the frames closest to the surrounding speech.
+
+    :param audio_data: 1-D array of samples
+    :param speech_flags: Boolean array with one VAD decision per frame of `audio_data`
+    :param frame_size: Number of samples per frame
+    :param max_pause_frames: Maximum number of silent frames to keep for each pause
+    :param padding_frames: Number of frames to keep around each speech frame
+    :return: The compacted audio, or `audio_data` itself if it contains no speech
+    """
+    keep = np.asarray(speech_flags, dtype=bool)[:len(audio_data) // frame_size]
+    frame_count = len(keep)
+    if not keep.any():
+        return audio_data
+
+    if padding_frames > 0:
+        keep = np.convolve(keep, np.ones(2 * padding_frames + 1), mode='same') > 0
+
+    silent = ~keep
+    run_starts = np.flatnonzero(silent & ~np.r_[False, silent[:-1]])
+    run_ends = np.flatnonzero(silent & ~np.r_[silent[1:], False]) + 1
+
+    # Map every silent frame to its run, and its position within that run
+    run_index = np.cumsum(silent & ~np.r_[False, silent[:-1]]) - 1
+    silent_index = np.flatnonzero(silent)
+    silent_run = run_index[silent_index]
+    starts = run_starts[silent_run]
+    ends = run_ends[silent_run]
+    position = silent_index - starts
+    length = ends - starts
+
+    # Keep the start and end of each internal pause, drop leading and trailing silence entirely
+    head = max_pause_frames - max_pause_frames // 2
+    tail = max_pause_frames // 2
+    keep_silent = (position < head) | (position >= length - tail)
+    keep_silent &= (starts > 0) & (ends < frame_count)
+    keep[silent_index] = keep_silent
+
+    if keep.all():
+        return audio_data
+    return audio_data[:frame_count * frame_size][np.repeat(keep, frame_size)]
+
+
+def find_split_points(speech_flags, frame_size, max_chunk_frames):
+    """
+    Choose where to split a recording into chunks of at most `max_chunk_frames` frames.
+
+    Each split is placed in the middle of the longest pause in the second half of the chunk,
+    so that words are not cut. A chunk without any pause there is split at its maximum length.
+
+    :param speech_flags: Boolean array with one VAD decision per frame of the recording
+    :param frame_size: Number of samples per frame
+    :param max_chunk_frames: Maximum number of frames per chunk
+    :return: List of sample offsets to split the recording at, in increasing order
+    """
+    silent = ~np.asarray(speech_flags, dtype=bool)
+    frame_count = len(silent)
+    split_frames = []
+    start = 0
+    while frame_count - start > max_chunk_frames:
+        window_start = start + max_chunk_frames // 2
+        window = silent[window_start:start + max_chunk_frames]
+        split = start + max_chunk_frames
+        if window.any():
+            edges = np.diff(np.r_[0, window.astype(np.int8), 0])
+            run_starts = np.flatnonzero(edges == 1)
+            run_ends = np.flatnonzero(edges == -1)
+            longest = np.argmax(run_ends - run_starts)
+            split = window_start + (run_starts[longest] + run_ends[longest]) // 2
+        split_frames.append(int(split))
+        start = split
+    return [frame * frame_size for frame in split_frames]
+
+
+class PolyphaseResampler:
+    """
+    A streaming polyphase resampler for float32 audio.
+
+    The rational ratio output_rate / input_rate is reduced to up / down and a Kaiser-windowed
+    sinc low-pass filter is split into `up` phases. Each output sample is the dot product of
+    one filter phase with the most recent input samples, which is computed for a whole block
+    at once. Filter history is carried across blocks, so blocks of any size can be fed as they
+    arrive. The returned samples live in a preallocated output buffer that is reused by the
+    next call.
+    """
+
+    def __init__(self, input_rate, output_rate, zero_crossings=16, rolloff=0.9, beta=8.0):
+        """
+        Initialize the PolyphaseResampler.
+
+        :param input_rate: Sample rate of the input audio in Hz
+        :param output_rate: Sample rate of the output audio in Hz
+        :param zero_crossings: Number of sinc zero crossings on each side of the filter
+        :param rolloff: Cutoff frequency as a fraction of the lower Nyquist frequency
+        :param beta: Kaiser window shape parameter
+        """
+        divisor = math.gcd(int(input_rate), int(output_rate))
+        self.up = int(output_rate) // divisor
+        self.down = int(input_rate) // divisor
+
+        # Design the prototype filter at the upsampled rate
+        factor = max(self.up, self.down)
+        cutoff = rolloff * 0.5 / factor
+        tap_count = 2 * zero_crossings * factor + 1
+        n = np.arange(tap_count) - (tap_count - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(tap_count, beta) * self.up
+
+        self.taps_per_phase = -(-tap_count // self.up)
+        padded = np.zeros(self.taps_per_phase * self.up)
+        padded[:tap_count] = prototype
+        # phases[p, k] = h[p + k * up]
+        self.phases = padded.reshape(self.taps_per_phase, self.up).T.astype(np.float32)
+
+        self._tap_offsets = np.arange(self.taps_per_phase)
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._work = np.zeros(0, dtype=np.float32)
+        self._output = np.zeros(0, dtype=np.float32)
+        self._position = 0
+
+    def reset(self):
+        """Clear the filter history."""
+        self._history[:] = 0
+        self._position = 0
+
+    def process(self, samples):
+        """
+        Resample a block of samples.
+
+        :param samples: 1-D float32 array at the input rate
+        :return: View of the resampled samples at the output rate, valid until the next call
+        """
+        input_count = len(samples)
+        history_count = len(self._history)
+        if len(self._work) < history_count + input_count:
+            self._work = np.zeros(history_count + input_count, dtype=np.float32)
+        work = self._work[:history_count + input_count]
+        work[:history_count] = self._history
+        work[history_count:] = samples
+
+        # Output j sits at position u = _position + j * down on the upsampled grid of this block
+        end = input_count * self.up
+        output_count = max(0, -(-(end - self._position) // self.down))
+        if len(self._output) < output_count:
+            self._output = np.zeros(output_count, dtype=np.float32)
+        output = self._output[:output_count]
+
+        if output_count:
+            positions = self._position + np.arange(output_count) * self.down
+            indices = (positions // self.up + history_count)[:, None] - self._tap_offsets[None, :]
+            np.einsum('nk,nk->n', work[indices], self.phases[positions % self.up], out=output)
+
+        self._position += output_count * self.down - end
+        if history_count:
+            self._history[:] = work[-history_count:]
+        return output
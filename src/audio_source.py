@@ -0,0 +1,246 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+
+from audio_processing import PolyphaseResampler
+from utils import ConfigManager
+
+
+class AudioSource(ABC):
+    """
+    Abstract base class for audio sources.
+
+    An audio source delivers mono audio at `sample_rate` in blocks of `dtype` samples to a
+    callback once it has been started. The AudioEngine owns the source and distributes the
+    blocks to recording sessions.
+    """
+
+    FRAME_DURATION_MS = 30
+
+    def __init__(self, sample_rate, dtype=np.int16):
+        """
+        Initialize the AudioSource.
+
+        :param sample_rate: Sample rate in Hz of the delivered audio
+        :param dtype: NumPy dtype of the delivered samples
+        """
+        self.sample_rate = sample_rate
+        self.dtype = dtype
+
+    @abstractmethod
+    def start(self, callback, finished_callback=None):
+        """
+        Start delivering audio.
+
+        :param callback: Callable receiving a 1-D NumPy array of samples for every block
+        :param finished_callback: Callable invoked if the source stops on its own
+        """
+        pass
+
+    @abstractmethod
+    def stop(self):
+        """
+        Stop delivering audio and release any resources.
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def active(self) -> bool:
+        """
+        Whether the source is currently delivering audio.
+        """
+        pass
+
+    def session_attached(self):
+        """
+        Called by the AudioEngine when a recording session attaches.
+        """
+        pass
+
+    def session_detached(self):
+        """
+        Called by the AudioEngine when a recording session detaches.
+        """
+        pass
+
+
+class MicrophoneSource(AudioSource):
+    """
+    Audio source capturing from a sound device using sounddevice.
+
+    In the native float32 mode the device is opened at its native sample rate and every block
+    is resampled to `sample_rate` with a PolyphaseResampler.
+    """
+
+    def __init__(self, sample_rate, device=None, native_float32=False):
+        """
+        Initialize the MicrophoneSource.
+
+        :param sample_rate: Sample rate in Hz of the delivered audio
+        :param device: Sound device index or name, or None for the default device
+        :param native_float32: Whether to capture float32 at the device's native rate
+        """
+        super().__init__(sample_rate, np.float32 if native_float32 else np.int16)
+        self.device = device
+        self.native_float32 = native_float32
+        self._stream = None
+        self._resampler = None
+        self._callback = None
+
+    def start(self, callback, finished_callback=None):
+        import sounddevice as sd
+
+        self._callback = callback
+        device_rate, dtype = self.sample_rate, 'int16'
+        self._resampler = None
+        if self.native_float32:
+            device_rate = int(sd.query_devices(self.device, 'input')['default_samplerate'])
+            dtype = 'float32'
+            if device_rate != self.sample_rate:
+                self._resampler = PolyphaseResampler(device_rate, self.sample_rate)
+                ConfigManager.console_print(f'Capturing at {device_rate} Hz and resampling to {self.sample_rate} Hz.')
+
+        stream = sd.InputStream(samplerate=device_rate, channels=1, dtype=dtype,
+                                blocksize=int(device_rate * (self.FRAME_DURATION_MS / 1000.0)),
+                                device=self.device, callback=self._audio_callback,
+                                finished_callback=finished_callback)
+        stream.start()
+        self._stream = stream
+
+    def stop(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.close(ignore_errors=True)
+            except Exception:
+                pass
+
+    @property
+    def active(self):
+        stream = self._stream
+        return stream is not None and stream.active
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        if status:
+            ConfigManager.console_print(f"Audio callback status: {status}")
+        samples = indata[:, 0]
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+        self._callback(samples)
+
+
+class ReplaySource(AudioSource):
+    """
+    Audio source replaying recorded audio, for running the pipeline without a microphone.
+
+    Audio is delivered in 30 ms blocks either at real-time speed or as fast as possible. It is
+    followed by a stretch of digital silence so that voice activity detection can find the
+    end of the last utterance. Replay only advances while a recording session is attached, so
+    no audio is lost between recordings and runs are reproducible, as long as all recordings
+    share one AudioEngine and with it one source. Once everything has been delivered, the
+    source stays active but silent.
+    """
+
+    def __init__(self, audio, sample_rate, realtime=True, trailing_silence=2.0):
+        """
+        Initialize the ReplaySource.
+
+        :param audio: 1-D int16 or float32 array at `sample_rate`
+        :param sample_rate: Sample rate in Hz of the audio
+        :param realtime: Deliver blocks at real-time speed instead of as fast as possible
+        :param trailing_silence: Seconds of silence delivered after the audio
+        """
+        super().__init__(sample_rate, audio.dtype.type)
+        self.realtime = realtime
+        padding = np.zeros(int(trailing_silence * sample_rate), dtype=audio.dtype)
+        self.audio = np.concatenate((audio, padding))
+        self.block_size = int(sample_rate * (self.FRAME_DURATION_MS / 1000.0))
+        self._position = 0
+        self._attached = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path, sample_rate, dtype=np.int16, realtime=True, trailing_silence=2.0):
+        """
+        Create a ReplaySource from an audio file, converting it to mono at `sample_rate`.
+
+        :param path: Path to a file readable by soundfile, e.g. a WAV file
+        """
+        import soundfile as sf
+
+        audio, file_rate = sf.read(path, dtype='float32', always_2d=True)
+        audio = audio.mean(axis=1, dtype=np.float32)
+        if file_rate != sample_rate:
+            resampler = PolyphaseResampler(file_rate, sample_rate)
+            audio = np.concatenate((resampler.process(audio),
+                                    resampler.process(np.zeros(resampler.taps_per_phase, dtype=np.float32))))
+        if np.dtype(dtype) == np.int16:
+            audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        return cls(audio, sample_rate, realtime=realtime, trailing_silence=trailing_silence)
+
+    def start(self, callback, finished_callback=None):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._replay_loop, args=(callback,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._attached.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def session_attached(self):
+        self._attached.set()
+
+    def session_detached(self):
+        self._attached.clear()
+
+    def _replay_loop(self, callback):
+        block_duration = self.block_size / self.sample_rate
+        next_time = None
+        while not self._stop_event.is_set():
+            if self._position >= len(self.audio):
+                self._stop_event.wait()
+                break
+
+            if not self._attached.is_set():
+                self._attached.wait()
+                next_time = None
+                continue
+
+            if self.realtime:
+                now = time.perf_counter()
+                if next_time is None:
+                    next_time = now
+                if next_time > now:
+                    time.sleep(next_time - now)
+                next_time += block_duration
+
+            block = self.audio[self._position:self._position + self.block_size]
+            self._position += len(block)
+            callback(block)
+
+
+def create_audio_source(sample_rate):
+    """
+    Create the audio source selected in the configuration.
+
+    :param sample_rate: Sample rate in Hz the source should deliver
+    """
+    recording_options = ConfigManager.get_config_section('recording_options')
+    native_float32 = recording_options.get('capture_mode') == 'native_float32'
+
+    if recording_options.get('audio_source') == 'file':
+        return ReplaySource.from_file(recording_options.get('replay_file'), sample_rate,
+                                      dtype=np.float32 if native_float32 else np.int16,
+                                      realtime=recording_options.get('replay_speed') != 'fast')
+
+    return MicrophoneSource(sample_rate, recording_options.get('sound_device'), native_float32)
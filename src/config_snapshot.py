@@ -0,0 +1,86 @@
+import functools
+import operator
+from dataclasses import make_dataclass, fields
+
+# Python types of the values accepted for each setting type of the configuration schema.
+# Text settings also accept integers, which YAML reads from unquoted numbers such as the
+# index in `sound_device: 3`.
+ACCEPTED_TYPES = {'bool': (bool,), 'int': (int,), 'float': (float,), 'str': (str, int)}
+
+
+def _is_setting(item):
+    return isinstance(item, dict) and 'value' in item
+
+
+def _class_name(path):
+    return ''.join(part.title().replace('_', '') for part in path) + 'Config'
+
+
+def compile_schema(schema, path=()):
+    """
+    Generate an immutable slotted dataclass for every section of the configuration schema.
+
+    Settings become fields typed after their schema type; sub-sections become fields holding
+    the dataclass of that sub-section. The schema of every field is kept in the class
+    attribute `_schema`, which build_snapshot uses for validation.
+
+    :param schema: Configuration schema, or a section of it
+    :return: Dataclass type for the (section of the) schema
+    """
+    class_fields = []
+    field_schemas = {}
+    for key, item in schema.items():
+        if _is_setting(item):
+            accepted_types = ACCEPTED_TYPES.get(item.get('type'))
+            setting_type = functools.reduce(operator.or_, accepted_types) if accepted_types else object
+            class_fields.append((key, setting_type | None))
+            field_schemas[key] = item
+        elif isinstance(item, dict):
+            section_type = compile_schema(item, path + (key,))
+            class_fields.append((key, section_type))
+            field_schemas[key] = section_type
+
+    return make_dataclass(_class_name(path) if path else 'Config', class_fields,
+                          namespace={'_schema': field_schemas}, frozen=True, slots=True)
+
+
+def _validate(value, item, path, warn):
+    """Return `value` converted to the setting's type, or its default if it does not fit."""
+    if value is None:
+        return None
+
+    accepted_types = ACCEPTED_TYPES.get(item.get('type'))
+    if accepted_types is None:
+        return value
+    # bool is a subclass of int, but only counts as a bool
+    is_bool = isinstance(value, bool)
+    if isinstance(value, accepted_types) and is_bool == (bool in accepted_types):
+        return value
+    if accepted_types == (float,) and isinstance(value, int) and not is_bool:
+        return float(value)
+
+    warn(f"Invalid value {value!r} for {'.'.join(path)}, expected {item['type']}. Using the default value.")
+    return item['value']
+
+
+def build_snapshot(snapshot_type, config, path=(), warn=print):
+    """
+    Create an immutable snapshot of the configuration, validating every setting once.
+
+    Settings that are missing from `config` get their schema default, and keys that are not
+    in the schema are left out.
+
+    :param snapshot_type: Dataclass type returned by compile_schema
+    :param config: Configuration dictionary
+    :param warn: Callable receiving a message for every invalid setting
+    :return: Instance of `snapshot_type`
+    """
+    config = config if isinstance(config, dict) else {}
+    values = {}
+    for field in fields(snapshot_type):
+        item = snapshot_type._schema[field.name]
+        if isinstance(item, type):
+            values[field.name] = build_snapshot(item, config.get(field.name), path + (field.name,), warn)
+        else:
+            values[field.name] = _validate(config.get(field.name, item['value']), item, path + (field.name,), warn)
+    return snapshot_type(**values)
@@ -0,0 +1,215 @@
+import time
+from abc import ABC, abstractmethod
+
+from tracing import tracer
+from transcription import (Segment, create_local_model, create_remote_model, get_api_client,
+                           iter_local_segments, preconnect_api, transcribe_api,
+                           transcribe_api_segments, warm_up_local_model)
+from utils import ConfigManager
+
+# Registered engine classes by name
+ENGINES = {}
+
+
+def register_engine(name):
+    """
+    Class decorator registering a TranscriptionEngine under `name`, so that it can be selected
+    with the `model_options.engine` configuration value.
+    """
+    def decorator(cls):
+        cls.name = name
+        ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+class TranscriptionEngine(ABC):
+    """
+    Abstract base class for transcription engines.
+
+    An engine is created unloaded, loaded once (possibly in a background thread), optionally
+    warmed up, and then used for any number of transcriptions until it is closed. Engines
+    return raw timed segments; post-processing is applied by the caller.
+    """
+
+    name = None
+
+    def __init__(self, model_name=None):
+        """
+        Initialize the engine.
+
+        :param model_name: Model to use instead of the configured one
+        """
+        self.model_name = model_name
+
+    def load(self):
+        """Load the model or open the client. Called once before the first transcription."""
+        pass
+
+    def warm_up(self):
+        """Run any one-off initialization that would otherwise slow down the first transcription."""
+        pass
+
+    def prepare(self):
+        """Called when a recording starts, to get ready for the transcription that will follow it."""
+        pass
+
+    @abstractmethod
+    def transcribe(self, audio_data, initial_prompt=None) -> list:
+        """
+        Transcribe audio data.
+
+        :param audio_data: 1-D int16 or float32 array at the recording sample rate
+        :param initial_prompt: Prompt to use instead of the configured initial prompt
+        :return: List of Segment
+        """
+        pass
+
+    def transcribe_timed(self, audio_data, initial_prompt=None):
+        """
+        Transcribe audio data into segments with accurate start and end times.
+
+        Engines whose transcribe() may return a single segment for the whole audio override
+        this to request segment times.
+        """
+        return self.transcribe(audio_data, initial_prompt)
+
+    def stream(self, audio_data, initial_prompt=None):
+        """
+        Transcribe audio data, yielding segments as soon as the engine produces them.
+
+        Engines that cannot produce segments incrementally yield them all at the end.
+        """
+        yield from self.transcribe(audio_data, initial_prompt)
+
+    def close(self):
+        """Release the model or client."""
+        pass
+
+
+@register_engine('faster_whisper')
+class FasterWhisperEngine(TranscriptionEngine):
+    """
+    Engine running a local faster-whisper model.
+    """
+
+    def __init__(self, model_name=None):
+        super().__init__(model_name)
+        self.model = None
+
+    def _create_model(self):
+        return create_local_model(self.model_name)
+
+    def load(self):
+        self.model = self._create_model()
+
+    def warm_up(self):
+        warm_up_local_model(self.model)
+
+    def transcribe(self, audio_data, initial_prompt=None):
+        return list(self.stream(audio_data, initial_prompt))
+
+    def stream(self, audio_data, initial_prompt=None):
+        yield from iter_local_segments(audio_data, self.model, initial_prompt)
+
+    def close(self):
+        self.model = None
+
+
+@register_engine('faster_whisper_api')
+class FasterWhisperApiEngine(FasterWhisperEngine):
+    """
+    Engine using a remote faster-whisper server through WhisperModelApiProxy.
+    """
+
+    def _create_model(self):
+        return create_remote_model(self.model_name)
+
+    def warm_up(self):
+        # The model runs on the server, which is warm already
+        pass
+
+
+@register_engine('openai')
+class OpenAIEngine(TranscriptionEngine):
+    """
+    Engine using the OpenAI transcription API or a compatible endpoint.
+
+    Transcriptions are requested as plain text and returned as a single segment. Segment times
+    are only requested when needed, as not every endpoint and model supports them.
+    """
+
+    def load(self):
+        get_api_client()
+
+    def prepare(self):
+        if ConfigManager.get_config_value('model_options', 'api', 'preconnect'):
+            preconnect_api()
+
+    def transcribe(self, audio_data, initial_prompt=None):
+        sample_rate = ConfigManager.get_config_value('recording_options', 'sample_rate') or 16000
+        text = transcribe_api(audio_data, initial_prompt, self.model_name)
+        return [Segment(0.0, len(audio_data) / sample_rate, text)]
+
+    def transcribe_timed(self, audio_data, initial_prompt=None):
+        return transcribe_api_segments(audio_data, initial_prompt, self.model_name)
+
+
+@register_engine('stub')
+class StubEngine(TranscriptionEngine):
+    """
+    Engine returning fixed text after a configurable delay, without any model.
+
+    Used to measure and test the rest of the pipeline deterministically. The delay is
+    `latency` milliseconds plus `latency_per_second` milliseconds for every second of audio.
+    One segment is produced for every `segment_duration` seconds of audio.
+    """
+
+    def __init__(self, model_name=None):
+        super().__init__(model_name)
+        stub_options = ConfigManager.get_config_section('model_options').get('stub') or {}
+        self.latency = (stub_options.get('latency') or 0) / 1000.0
+        self.latency_per_second = (stub_options.get('latency_per_second') or 0) / 1000.0
+        self.segment_duration = stub_options.get('segment_duration') or 5.0
+        self.text = stub_options.get('text') or ''
+        self.sample_rate = ConfigManager.get_config_value('recording_options', 'sample_rate') or 16000
+
+    def transcribe(self, audio_data, initial_prompt=None):
+        return list(self.stream(audio_data, initial_prompt))
+
+    def stream(self, audio_data, initial_prompt=None):
+        duration = len(audio_data) / self.sample_rate
+        segment_count = max(1, int(-(-duration // self.segment_duration)))
+        delay = (self.latency + self.latency_per_second * duration) / segment_count
+        start_time = time.time()
+        for index in range(segment_count):
+            time.sleep(delay)
+            start = index * self.segment_duration
+            yield Segment(start, min(duration, start + self.segment_duration), ' ' + self.text.strip())
+        tracer.record('inference', start_time, time.time())
+
+
+def create_engine(name=None, model_name=None):
+    """
+    Create the transcription engine selected in the configuration, without loading it.
+
+    With the engine set to 'auto', the OpenAI API is used if `use_api` is set, a remote
+    faster-whisper server if its base URL is set, and a local faster-whisper model otherwise.
+
+    :param name: Engine name to use instead of the configured one
+    :param model_name: Model to use instead of the configured one
+    """
+    model_options = ConfigManager.get_config_section('model_options')
+    name = name or model_options.get('engine') or 'auto'
+
+    if name == 'auto':
+        if model_options.get('use_api'):
+            name = 'openai'
+        elif model_options['local'].get('faster_whisper_api_base_url'):
+            name = 'faster_whisper_api'
+        else:
+            name = 'faster_whisper'
+
+    if name not in ENGINES:
+        raise ValueError(f'Unknown transcription engine: {name}')
+    return ENGINES[name](model_name)
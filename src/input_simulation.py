@@ -1,27 +1,253 @@
-import subprocess
+import collections
+import functools
 import os
-import signal
+import subprocess
+import threading
 import time
-from pynput.keyboard import Controller as PynputController
+from pynput.keyboard import Controller as PynputController, Key
 
 from utils import ConfigManager
 
-def run_command_or_exit_on_failure(command):
+# Number of restarts of a helper process allowed within HELPER_RESTART_WINDOW seconds
+HELPER_MAX_RESTARTS = 3
+HELPER_RESTART_WINDOW = 30.0
+
+# Seconds to wait for a helper process to type what it was given before it is stopped
+HELPER_DRAIN_TIMEOUT = 5.0
+
+
+class HelperProcess:
     """
-    Run a shell command and exit if it fails.
+    A long-lived typing tool process that reads its input on stdin.
 
-    Args:
-        command (list): The command to run as a list of strings.
+    Spawning a tool for every piece of text costs more than typing short text, so one process
+    is kept running and fed through a pipe. If the process has died or a write fails, it is
+    started again and the data is resent, up to HELPER_MAX_RESTARTS times within
+    HELPER_RESTART_WINDOW seconds; after that, writes fail without stopping the application.
     """
-    try:
-        subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command: {e}")
-        exit(1)
+
+    def __init__(self, command):
+        """
+        Initialize the HelperProcess. The process is started on the first write.
+
+        Args:
+            command (list): The command to run as a list of strings.
+        """
+        self.command = command
+        self.process = None
+        self._restarts = collections.deque()
+
+    def _start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, text=True)
+
+    def write(self, data):
+        """
+        Write data to the process with a single flush, restarting the process if needed.
+
+        Args:
+            data (str): The data to write.
+
+        Returns:
+            bool: False if the process could not be (re)started or did not accept the data.
+        """
+        while True:
+            try:
+                if self.process is None:
+                    self._start()
+                elif self.process.poll() is not None:
+                    raise BrokenPipeError(f'exited with code {self.process.returncode}')
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+                return True
+            except OSError as e:
+                ConfigManager.console_print(f"Error writing to {self.command[0]}: {e}")
+                self.close()
+
+            now = time.time()
+            while self._restarts and now - self._restarts[0] > HELPER_RESTART_WINDOW:
+                self._restarts.popleft()
+            if len(self._restarts) >= HELPER_MAX_RESTARTS:
+                ConfigManager.console_print(f'{self.command[0]} keeps failing, not restarting it.')
+                return False
+            self._restarts.append(now)
+            ConfigManager.console_print(f'Restarting {self.command[0]}...')
+
+    def close(self, timeout=1.0):
+        """
+        Close the input of the process and wait until it has processed it and exited. The
+        process is killed if it takes longer than `timeout` seconds.
+        """
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+# Key names of the characters the uinput input method can type on a US keyboard layout,
+# and whether shift is held for them
+UINPUT_CHARACTERS = {
+    **{char: (f'KEY_{char.upper()}', False) for char in 'abcdefghijklmnopqrstuvwxyz0123456789'},
+    **{char: (f'KEY_{char}', True) for char in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'},
+    **{char: (f'KEY_{digit}', True) for char, digit in zip('!@#$%^&*()', '1234567890')},
+    ' ': ('KEY_SPACE', False), '\n': ('KEY_ENTER', False), '\t': ('KEY_TAB', False), '\b': ('KEY_BACKSPACE', False),
+    '-': ('KEY_MINUS', False), '_': ('KEY_MINUS', True), '=': ('KEY_EQUAL', False), '+': ('KEY_EQUAL', True),
+    '[': ('KEY_LEFTBRACE', False), '{': ('KEY_LEFTBRACE', True),
+    ']': ('KEY_RIGHTBRACE', False), '}': ('KEY_RIGHTBRACE', True),
+    '\\': ('KEY_BACKSLASH', False), '|': ('KEY_BACKSLASH', True),
+    ';': ('KEY_SEMICOLON', False), ':': ('KEY_SEMICOLON', True),
+    "'": ('KEY_APOSTROPHE', False), '"': ('KEY_APOSTROPHE', True),
+    '`': ('KEY_GRAVE', False), '~': ('KEY_GRAVE', True),
+    ',': ('KEY_COMMA', False), '<': ('KEY_COMMA', True),
+    '.': ('KEY_DOT', False), '>': ('KEY_DOT', True),
+    '/': ('KEY_SLASH', False), '?': ('KEY_SLASH', True),
+}
+
+# Number of keystroke plans kept for text that is typed again
+KEYSTROKE_PLAN_CACHE_SIZE = 256
+
+
+class UInputKeyboard:
+    """
+    A virtual keyboard that types text by writing key events to a uinput device.
+
+    Text is compiled into a keystroke plan: a list of reports, each a few key events that are
+    written together and followed by a single syn event. Shift is pressed once for a run of
+    shifted characters instead of for every character, and the release of a key shares a
+    report with the press of the next one. Plans are cached, so repeated text is compiled once.
+    """
+
+    def __init__(self):
+        """
+        Initialize the UInputKeyboard, creating the uinput device.
+
+        Raises:
+            ImportError: If the evdev library is not installed.
+            OSError: If the uinput device cannot be created, e.g. without access to /dev/uinput.
+        """
+        import evdev
+
+        self.evdev = evdev
+        self.shift = evdev.ecodes.KEY_LEFTSHIFT
+        self.keys = {char: (getattr(evdev.ecodes, name), shifted)
+                     for char, (name, shifted) in UINPUT_CHARACTERS.items()}
+        codes = {code for code, _ in self.keys.values()} | {self.shift} | set(LINUX_KEY_CODES.values())
+        self.device = evdev.UInput({evdev.ecodes.EV_KEY: sorted(codes)}, name='whisper-writer-keyboard')
+        # Number of characters skipped because they have no key
+        self.dropped_characters = 0
+        self.plan = functools.lru_cache(maxsize=KEYSTROKE_PLAN_CACHE_SIZE)(self._compile)
+
+    def _compile(self, text):
+        """
+        Compile text into a keystroke plan.
+
+        Returns:
+            tuple: The reports, each a tuple of the (code, value) key events and the number of
+                characters typed once the report is sent, the text that the reports type, which
+                leaves out the characters that have no key, and the number of left out characters.
+        """
+        reports = []
+        events = []
+        typable = []
+        shift_down = False
+        last_code = None
+        for char in text:
+            if char not in self.keys:
+                continue
+            code, shifted = self.keys[char]
+            if code == last_code:
+                # Pressing a key again in the report that releases it would not register
+                reports.append((tuple(events), len(typable)))
+                events = []
+            if shifted != shift_down:
+                events.append((self.shift, int(shifted)))
+                shift_down = shifted
+            events.append((code, 1))
+            typable.append(char)
+            reports.append((tuple(events), len(typable)))
+            events = [(code, 0)]
+            last_code = code
+        if shift_down:
+            events.append((self.shift, 0))
+        if events:
+            reports.append((tuple(events), len(typable)))
+        return tuple(reports), ''.join(typable), len(text) - len(typable)
+
+    def type(self, text, report_delay, cancel_event=None):
+        """
+        Type text, waiting `report_delay` seconds after each report.
+
+        Args:
+            text (str): The text to type.
+            report_delay (float): The delay in seconds between reports.
+            cancel_event (threading.Event): Stops typing when set.
+
+        Returns:
+            str: The text that was typed, without the characters that have no key and the
+                characters that were not reached before cancelling.
+        """
+        reports, typable, dropped = self.plan(text)
+        if dropped:
+            self.dropped_characters += dropped
+            unsupported = ''.join(sorted(set(text) - set(typable)))
+            ConfigManager.console_print(f'Cannot type {dropped} characters with uinput, skipping them: {unsupported}')
+
+        typed = 0
+        held = set()
+        for events, typed_after in reports:
+            if cancel_event and cancel_event.is_set():
+                # Release what is held, so that the keys do not repeat
+                self._write([(code, 0) for code in held])
+                break
+            self._write(events)
+            typed = typed_after
+            for code, value in events:
+                (held.add if value else held.discard)(code)
+            if report_delay:
+                time.sleep(report_delay)
+        return typable[:typed]
+
+    def press_keys(self, codes):
+        """Press the keys in order and release them in reverse order, e.g. for a shortcut."""
+        self._write([(code, 1) for code in codes])
+        self._write([(code, 0) for code in reversed(codes)])
+
+    def _write(self, events):
+        if not events:
+            return
+        for code, value in events:
+            self.device.write(self.evdev.ecodes.EV_KEY, code, value)
+        self.device.syn()
+
+    def close(self):
+        """Remove the uinput device."""
+        self.device.close()
+
+
+# Linux input event codes of the keys used in paste shortcuts, for ydotool and uinput
+LINUX_KEY_CODES = {'ctrl': 29, 'shift': 42, 'alt': 56, 'super': 125, 'v': 47, 'insert': 110}
+
+# Linux input event code of the backspace key, for ydotool
+BACKSPACE_KEY_CODE = 14
+
+# Number of characters passed to an external typing tool at a time, so that typing can be cancelled
+CANCEL_CHUNK_SIZE = 32
+
+# pynput keys of the modifiers and special keys used in paste shortcuts
+PYNPUT_KEYS = {'ctrl': Key.ctrl, 'shift': Key.shift, 'alt': Key.alt, 'super': Key.cmd, 'insert': Key.insert}
 
 class InputSimulator:
     """
     A class to simulate keyboard input using various methods.
+
+    With the 'paste' input method, text is placed on the clipboard and pasted with a single
+    shortcut sent through the configured paste backend, which also types the text key by key
+    whenever the clipboard cannot be used.
+
+    The text typed since start_output() is remembered as the current output, so that it can be
+    revised with replace_output(), which only erases and types what changed.
     """
 
     def __init__(self):
@@ -29,90 +255,382 @@ class InputSimulator:
         Initialize the InputSimulator with the specified configuration.
         """
         self.input_method = ConfigManager.get_config_value('post_processing', 'input_method')
-        self.dotool_process = None
+        self.helper = None
+        self.uinput = None
+        self.output = ''
+        self.output_generation = None
+        self._revision_start = 0
+        self.typed_characters = 0
+        self.typing_time = 0.0
+        self._saved_clipboard = None
+        self._restore_timer = None
+        self._clipboard_lock = threading.Lock()
+
+        # Method used to send keys; the paste method sends its shortcut through another one
+        self.key_method = self.input_method
+        if self.input_method == 'paste':
+            self.key_method = ConfigManager.get_config_value('post_processing', 'paste_backend') or 'pynput'
 
-        if self.input_method == 'pynput':
+        if self.key_method == 'uinput':
+            try:
+                self.uinput = UInputKeyboard()
+            except (ImportError, OSError) as e:
+                ConfigManager.console_print(f'Cannot use uinput, falling back to pynput: {e}')
+                self.key_method = 'pynput'
+                if self.input_method == 'uinput':
+                    self.input_method = 'pynput'
+
+        if self.key_method == 'pynput':
             self.keyboard = PynputController()
-        elif self.input_method == 'dotool':
-            self._initialize_dotool()
 
-    def _initialize_dotool(self):
+    def typewrite(self, text, cancel_event=None):
         """
-        Initialize the dotool process for input simulation.
+        Simulate typing the given text with the specified interval between keystrokes.
+
+        Args:
+            text (str): The text to type.
+            cancel_event (threading.Event): Stops typing the rest of the text when set. Text
+                that was already handed to an external tool is still typed.
         """
-        self.dotool_process = subprocess.Popen("dotool", stdin=subprocess.PIPE, text=True)
-        assert self.dotool_process.stdin is not None
+        start_time = time.perf_counter()
+        typed = self._typewrite(text, cancel_event)
+        self.output += typed
+        self._report_rate(len(typed), time.perf_counter() - start_time)
 
-    def _terminate_dotool(self):
+    def start_output(self, generation=None):
         """
-        Terminate the dotool process if it's running.
+        Start a new output, so that replace_output() leaves the text typed so far alone.
+
+        Args:
+            generation: Identifies the output in revise_output().
         """
-        if self.dotool_process:
-            os.kill(self.dotool_process.pid, signal.SIGINT)
-            self.dotool_process = None
+        self.output = ''
+        self.output_generation = generation
+        self._revision_start = 0
 
-    def typewrite(self, text):
+    def replace_output(self, text, cancel_event=None):
         """
-        Simulate typing the given text with the specified interval between keystrokes.
+        Replace the text typed since start_output() with `text`.
+
+        Only the difference is sent: the text after the longest common prefix of the current
+        output and `text` is erased with backspaces, and the rest of `text` is typed. This
+        assumes that the cursor is still at the end of the output.
 
         Args:
-            text (str): The text to type.
+            text (str): The new output.
+            cancel_event (threading.Event): Stops typing the new text when set.
+        """
+        prefix_length = len(os.path.commonprefix([self.output, text]))
+        erase_count = len(self.output) - prefix_length
+        if erase_count:
+            if not self._erase(erase_count):
+                ConfigManager.console_print('Cannot erase the previous output, leaving it unchanged.')
+                return
+            self.output = self.output[:prefix_length]
+        if prefix_length < len(text):
+            self.typewrite(text[prefix_length:], cancel_event)
+
+    def revise_output(self, draft, text, generation, cancel_event=None):
+        """
+        Replace the first occurrence of `draft` after the previous revision in the current
+        output with `text`. Revisions are expected in the order the drafts were typed, also
+        when a draft stays the same, so that identical drafts are told apart. Revisions of
+        drafts typed in an earlier output are dropped, even if the current output contains
+        the same text.
+
+        Text typed after the draft is erased and typed again as well, as the cursor has to
+        move back through it.
+
+        Args:
+            draft (str): The text to replace.
+            text (str): The text to replace it with.
+            generation: Generation of the output the draft was typed in.
+            cancel_event (threading.Event): Stops typing when set.
+
+        Returns:
+            bool: False if the draft was typed in another output or is not part of it.
+        """
+        if generation is None or generation != self.output_generation:
+            return False
+        start = self.output.find(draft, self._revision_start) if draft else -1
+        if start < 0:
+            return False
+        following = self.output[start + len(draft):]
+        if text != draft:
+            self.replace_output(self.output[:start] + text + following, cancel_event)
+        # Characters that could not be typed are missing from the output, so the end of the
+        # revised text is found from the text that follows it
+        if self.output.endswith(following):
+            self._revision_start = len(self.output) - len(following)
+        else:
+            self._revision_start = len(self.output)
+        return True
+
+    def _erase(self, count):
+        """
+        Press backspace `count` times with the key method.
+
+        Returns:
+            bool: False if the key presses could not be sent.
+        """
+        if self.key_method == 'uinput':
+            erased = self.uinput.type('\b' * count, ConfigManager.settings().post_processing.uinput_report_delay)
+            return len(erased) == count
+        if self.key_method == 'pynput':
+            for _ in range(count):
+                self.keyboard.press(Key.backspace)
+                self.keyboard.release(Key.backspace)
+            return True
+        if self.key_method == 'ydotool':
+            self._wait_for_ydotool_typing()
+            try:
+                subprocess.run(['ydotool', 'key'] + [f'{BACKSPACE_KEY_CODE}:1', f'{BACKSPACE_KEY_CODE}:0'] * count,
+                               check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                ConfigManager.console_print(f'Error running ydotool: {e}')
+                return False
+            return True
+        if self.key_method == 'dotool':
+            return self._helper_process(['dotool']).write('key backspace\n' * count)
+        return False
+
+    def _typewrite(self, text, cancel_event):
+        """
+        Type the text with the input method and return the part of it that was typed, which is
+        shorter than `text` if typing was cancelled or characters could not be typed.
+        """
+        post_processing = ConfigManager.settings().post_processing
+        if self.input_method == 'paste' and len(text) >= (post_processing.paste_min_length or 0):
+            if self._paste(text, post_processing):
+                return text
+
+        if self.key_method == 'uinput':
+            return self.uinput.type(text, post_processing.uinput_report_delay or 0.0, cancel_event)
+
+        interval = post_processing.writing_key_press_delay or 0.0
+        if self.key_method == 'pynput':
+            return text[:self._typewrite_pynput(text, interval, cancel_event)]
+
+        # The tools type asynchronously, so each chunk is followed by the time it takes to type
+        # it, holding every key and then waiting for the key delay. This keeps the text that
+        # cancelling cannot stop down to about one chunk, and the typing rate close to the
+        # rate the tool types at.
+        hold = post_processing.writing_key_hold_time or 0.0
+        typed = 0
+        for start in range(0, len(text), CANCEL_CHUNK_SIZE):
+            if cancel_event and cancel_event.is_set():
+                break
+            chunk = text[start:start + CANCEL_CHUNK_SIZE]
+            if self.key_method == 'ydotool':
+                written = self._typewrite_ydotool(chunk, interval, hold)
+            elif self.key_method == 'dotool':
+                written = self._typewrite_dotool(chunk, interval, hold)
+            else:
+                written = False
+            if not written:
+                break
+            typed += len(chunk)
+            time.sleep(len(chunk) * (interval + hold))
+        return text[:typed]
+
+    def _report_rate(self, typed, elapsed):
+        """Print the typing rate of the last text and the average rate so far."""
+        if not typed or elapsed <= 0:
+            return
+        self.typed_characters += typed
+        self.typing_time += elapsed
+        ConfigManager.console_print(f'Typed {typed} characters at {typed / elapsed:.0f} characters/s '
+                                    f'(average {self.typed_characters / self.typing_time:.0f} characters/s).')
+
+    def _paste(self, text, post_processing):
+        """
+        Paste the text through the clipboard, restoring the previous clipboard content afterwards.
+
+        Args:
+            text (str): The text to paste.
+            post_processing: The post_processing section of the configuration snapshot.
+
+        Returns:
+            bool: False if the clipboard could not be used and the text has to be typed instead.
+        """
+        try:
+            import pyperclip
+
+            with self._clipboard_lock:
+                # A restore that is still pending would overwrite this text; the clipboard
+                # content saved for it is the one to restore after this paste as well. If the
+                # timer already fired and waits for the lock, it finds that it was replaced.
+                if self._restore_timer is not None:
+                    self._restore_timer.cancel()
+                    self._restore_timer = None
+                else:
+                    self._saved_clipboard = pyperclip.paste()
+
+                pyperclip.copy(text)
+                if pyperclip.paste() != text:
+                    raise RuntimeError('the clipboard did not accept the text')
+        except Exception as e:
+            ConfigManager.console_print(f'Cannot paste through the clipboard, typing instead: {e}')
+            return False
+
+        try:
+            self._send_shortcut(post_processing.paste_shortcut or 'ctrl+v')
+        except Exception as e:
+            ConfigManager.console_print(f'Cannot send the paste shortcut, typing instead: {e}')
+            self._restore_clipboard()
+            return False
+
+        # The target reads the clipboard asynchronously, so restore it after a delay
+        with self._clipboard_lock:
+            self._restore_timer = threading.Timer(post_processing.paste_restore_delay or 0.0,
+                                                  self._restore_clipboard, kwargs={'scheduled': True})
+            self._restore_timer.daemon = True
+            self._restore_timer.start()
+        return True
+
+    def _restore_clipboard(self, scheduled=False):
+        """
+        Put the clipboard content from before pasting back.
+
+        Args:
+            scheduled (bool): Called by the restore timer. Nothing is restored if the timer was
+                cancelled or replaced by a later paste in the meantime, as the saved content
+                then belongs to that paste.
+        """
+        import pyperclip
+
+        with self._clipboard_lock:
+            if scheduled and threading.current_thread() is not self._restore_timer:
+                return
+            self._restore_timer = None
+            saved, self._saved_clipboard = self._saved_clipboard, None
+            try:
+                pyperclip.copy(saved or '')
+            except Exception as e:
+                ConfigManager.console_print(f'Error restoring the clipboard: {e}')
+
+    def _send_shortcut(self, shortcut):
+        """
+        Press and release a key combination such as 'ctrl+shift+v' with the key method.
+
+        Args:
+            shortcut (str): Keys joined by '+', modifiers first.
         """
-        interval = ConfigManager.get_config_value('post_processing', 'writing_key_press_delay')
-        if self.input_method == 'pynput':
-            self._typewrite_pynput(text, interval)
-        elif self.input_method == 'ydotool':
-            self._typewrite_ydotool(text, interval)
-        elif self.input_method == 'dotool':
-            self._typewrite_dotool(text, interval)
+        keys = [key.strip().lower() for key in shortcut.split('+')]
+        if self.key_method == 'pynput':
+            *modifiers, key = [PYNPUT_KEYS.get(key, key) for key in keys]
+            with self.keyboard.pressed(*modifiers):
+                self.keyboard.press(key)
+                self.keyboard.release(key)
+            return
+
+        if self.key_method in ('ydotool', 'uinput'):
+            unknown = [key for key in keys if key not in LINUX_KEY_CODES]
+            if unknown:
+                raise ValueError(f"Unsupported key in paste shortcut: {', '.join(unknown)}")
+            codes = [LINUX_KEY_CODES[key] for key in keys]
 
-    def _typewrite_pynput(self, text, interval):
+        if self.key_method == 'uinput':
+            self.uinput.press_keys(codes)
+        elif self.key_method == 'ydotool':
+            events = [f'{code}:1' for code in codes] + [f'{code}:0' for code in reversed(codes)]
+            self._wait_for_ydotool_typing()
+            subprocess.run(['ydotool', 'key'] + events, check=True)
+        elif self.key_method == 'dotool':
+            if not self._helper_process(['dotool']).write(f"key {'+'.join(keys)}\n"):
+                raise RuntimeError('dotool is not running')
+
+    def _typewrite_pynput(self, text, interval, cancel_event=None):
         """
         Simulate typing using pynput.
 
         Args:
             text (str): The text to type.
             interval (float): The interval between keystrokes in seconds.
+            cancel_event (threading.Event): Stops typing when set.
+
+        Returns:
+            int: The number of characters typed.
         """
-        for char in text:
+        for typed, char in enumerate(text):
+            if cancel_event and cancel_event.is_set():
+                return typed
             self.keyboard.press(char)
             self.keyboard.release(char)
             time.sleep(interval)
+        return len(text)
 
-    def _typewrite_ydotool(self, text, interval):
+    def _helper_process(self, command):
         """
-        Simulate typing using ydotool.
+        Return the helper process running `command`, replacing the one running another command.
+
+        Args:
+            command (list): The command to run as a list of strings.
+        """
+        if self.helper is None or self.helper.command != command:
+            if self.helper is not None:
+                self.helper.close()
+            self.helper = HelperProcess(command)
+        return self.helper
+
+    def _wait_for_ydotool_typing(self):
+        """
+        Wait until the ydotool typing process has typed everything it was given, so that keys
+        sent through another ydotool process do not interleave with the text. The process is
+        started again for the next text.
+        """
+        if self.helper is not None and self.helper.command[:2] == ['ydotool', 'type']:
+            self.helper.close(timeout=HELPER_DRAIN_TIMEOUT)
+
+    def _typewrite_ydotool(self, text, interval, hold):
+        """
+        Simulate typing using a ydotool process that types what it reads from stdin.
 
         Args:
             text (str): The text to type.
             interval (float): The interval between keystrokes in seconds.
+            hold (float): The time in seconds each key is held down.
+
+        Returns:
+            bool: False if ydotool could not be given the text.
         """
-        cmd = "ydotool"
-        run_command_or_exit_on_failure([
-            cmd,
-            "type",
-            "--key-delay",
-            str(interval * 1000),
-            "--",
-            text,
-        ])
+        # The key timing is given on the command line, so changing it starts another process
+        helper = self._helper_process(['ydotool', 'type', '--key-delay', str(int(interval * 1000)),
+                                       '--key-hold', str(int(hold * 1000)), '--file', '-'])
+        return helper.write(text)
 
-    def _typewrite_dotool(self, text, interval):
+    def _typewrite_dotool(self, text, interval, hold):
         """
         Simulate typing using dotool.
 
         Args:
             text (str): The text to type.
             interval (float): The interval between keystrokes in seconds.
+            hold (float): The time in seconds each key is held down.
+
+        Returns:
+            bool: False if dotool could not be given the text.
         """
-        assert self.dotool_process and self.dotool_process.stdin
-        self.dotool_process.stdin.write(f"typedelay {interval * 1000}\n")
-        self.dotool_process.stdin.write(f"type {text}\n")
-        self.dotool_process.stdin.flush()
+        # The key timing is sent with every batch, so that a restarted process gets it too
+        commands = [f'typedelay {interval * 1000}\n', f'typehold {hold * 1000}\n']
+        # A command ends at a newline, so line breaks are sent as key presses
+        for index, line in enumerate(text.split('\n')):
+            if index:
+                commands.append('key enter\n')
+            if line:
+                commands.append(f'type {line}\n')
+        return self._helper_process(['dotool']).write(''.join(commands))
 
     def cleanup(self):
         """
-        Perform cleanup operations, such as terminating the dotool process.
+        Perform cleanup operations, such as closing the typing tool process.
         """
-        if self.input_method == 'dotool':
-            self._terminate_dotool()
+        if self._restore_timer is not None:
+            self._restore_timer.cancel()
+            self._restore_clipboard()
+        if self.helper is not None:
+            self.helper.close()
+            self.helper = None
+        if self.uinput is not None:
+            self.uinput.close()
+            self.uinput = None
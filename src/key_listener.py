@@ -1,7 +1,9 @@
+import time
 from abc import ABC, abstractmethod
 from enum import Enum, auto
 from typing import Callable, Set
 
+from tracing import tracer
 from utils import ConfigManager
 
 
@@ -205,6 +207,10 @@ class InputBackend(ABC):
     This class defines the interface that all input backends must implement.
     """
 
+    # time.time() timestamp at which the device reported the event being handled, if the
+    # backend knows it
+    event_time = None
+
     @classmethod
     @abstractmethod
     def is_available(cls) -> bool:
@@ -281,10 +287,13 @@ class KeyListener:
         self.backends = []
         self.active_backend = None
         self.key_chord = None
+        self.cancel_chord = None
         self.callbacks = {
             "on_activate": [],
-            "on_deactivate": []
+            "on_deactivate": [],
+            "on_cancel": []
         }
+        self.event_time = None
         self.load_activation_keys()
         self.initialize_backends()
         self.select_backend_from_config()
@@ -317,11 +326,19 @@ class KeyListener:
                 self.select_active_backend()
 
     def select_active_backend(self):
-        """Select the first available backend as active."""
+        """
+        Select the first available backend as active. When it replaces an active backend, the
+        previous one is stopped and the new one started, as in set_active_backend.
+        """
         if not self.backends:
             raise RuntimeError("No supported input backend found")
+        previous_backend = self.active_backend
+        if previous_backend:
+            self.stop()
         self.active_backend = self.backends[0]
         self.active_backend.on_input_event = self.on_input_event
+        if previous_backend:
+            self.start()
 
     def set_active_backend(self, backend_class):
         """Set a specific backend as active."""
@@ -336,7 +353,10 @@ class KeyListener:
             raise ValueError(f"Backend {backend_class.__name__} is not available")
 
     def update_backend(self):
-        """Update the active backend based on current configuration."""
+        """
+        Update the active backend based on current configuration. The previous backend is
+        stopped and the selected one started, so that only one of them delivers events.
+        """
         self.select_backend_from_config()
 
     def start(self):
@@ -352,11 +372,14 @@ class KeyListener:
             self.active_backend.stop()
 
     def load_activation_keys(self):
-        """Load activation keys from configuration."""
+        """Load activation keys and the optional output cancel keys from configuration."""
         key_combination = ConfigManager.get_config_value('recording_options', 'activation_key')
         keys = self.parse_key_combination(key_combination)
         self.set_activation_keys(keys)
 
+        cancel_combination = ConfigManager.get_config_value('post_processing', 'cancel_output_key')
+        self.cancel_chord = KeyChord(self.parse_key_combination(cancel_combination)) if cancel_combination else None
+
     def parse_key_combination(self, combination_string: str) -> Set[KeyCode | frozenset[KeyCode]]:
         """Parse a string representation of key combination into a set of KeyCodes."""
         keys = set()
@@ -390,13 +413,24 @@ class KeyListener:
 
         key, event_type = event
 
+        if self.cancel_chord:
+            was_pressed = self.cancel_chord.is_active()
+            if self.cancel_chord.update(key, event_type) and not was_pressed:
+                self._trigger_callbacks("on_cancel")
+
         was_active = self.key_chord.is_active()
         is_active = self.key_chord.update(key, event_type)
+        if was_active == is_active:
+            return
+
+        # Time at which the key chord changed, from the device's timestamp if available
+        now = time.time()
+        event_time = self.active_backend.event_time
+        if event_time is not None:
+            tracer.record('key_event', event_time, now)
+        self.event_time = event_time or now
 
-        if not was_active and is_active:
-            self._trigger_callbacks("on_activate")
-        elif was_active and not is_active:
-            self._trigger_callbacks("on_deactivate")
+        self._trigger_callbacks("on_activate" if is_active else "on_deactivate")
 
     def add_callback(self, event: str, callback: Callable):
         """Add a callback function for a specific event."""
@@ -520,6 +554,7 @@ class EvdevBackend(InputBackend):
         """Process a single input event."""
         key_code, event_type = self._translate_key_event(event)
         if key_code is not None and event_type is not None:
+            self.event_time = event.timestamp()
             self.on_input_event((key_code, event_type))
 
     def _translate_key_event(self, event) -> tuple[KeyCode | None, InputEvent | None]:
@@ -1,23 +1,38 @@
+import argparse
+import functools
 import os
 import sys
 import time
 from audioplayer import AudioPlayer
 from pynput.keyboard import Controller
-from PyQt5.QtCore import QObject, QProcess
+from PyQt5.QtCore import QObject
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QMessageBox
 
+from audio_engine import AudioEngine
 from key_listener import KeyListener
 from result_thread import ResultThread
 from ui.main_window import MainWindow
 from ui.settings_window import SettingsWindow
 from ui.status_window import StatusWindow
-from transcription import create_local_model
+from model_loader import ModelLoaderThread
 from input_simulation import InputSimulator
+from output_worker import OutputWorker
+from refiner import Refiner
+from tracing import tracer, configure_tracing, export_traces
 from utils import ConfigManager
 
 
 class WhisperWriterApp(QObject):
+    # Settings the persistent audio engine is created from
+    AUDIO_ENGINE_SETTINGS = ('sample_rate', 'sound_device', 'persistent_stream', 'pre_roll_duration',
+                             'audio_source', 'replay_file', 'replay_speed', 'capture_mode')
+
+    # Settings the transcription engine is loaded with
+    MODEL_SETTINGS = (('model_options', 'engine'), ('model_options', 'use_api'), ('model_options', 'local'),
+                      ('model_options', 'stub'), ('model_options', 'common', 'chunked_transcription'),
+                      ('model_options', 'common', 'chunk_workers'))
+
     def __init__(self):
         """
         Initialize the application, opening settings window if no configuration file is found.
@@ -27,10 +42,18 @@ class WhisperWriterApp(QObject):
         self.app.setWindowIcon(QIcon(os.path.join('assets', 'ww-logo.png')))
 
         ConfigManager.initialize()
+        self.apply_command_line_options()
+        # Command line overrides are part of the initial state, not changes to apply
+        ConfigManager.apply_changes()
+        configure_tracing()
+
+        self.key_listener = None
+        self.output_worker = None
+        self.refiner = None
 
         self.settings_window = SettingsWindow()
         self.settings_window.settings_closed.connect(self.on_settings_closed)
-        self.settings_window.settings_saved.connect(self.restart_app)
+        self.settings_window.settings_saved.connect(self.apply_settings)
 
         if ConfigManager.config_file_exists():
             self.initialize_components()
@@ -38,19 +61,47 @@ class WhisperWriterApp(QObject):
             print('No valid configuration file found. Opening settings window...')
             self.settings_window.show()
 
+    def apply_command_line_options(self):
+        """
+        Override configuration values with options given on the command line.
+        """
+        parser = argparse.ArgumentParser(description='WhisperWriter')
+        parser.add_argument('--replay', metavar='FILE',
+                            help='Replay an audio file instead of recording from the microphone.')
+        parser.add_argument('--replay-speed', choices=['realtime', 'fast'],
+                            help='Replay the audio file at real-time speed or as fast as possible.')
+        args, _ = parser.parse_known_args()
+
+        if args.replay:
+            ConfigManager.set_config_value('file', 'recording_options', 'audio_source')
+            ConfigManager.set_config_value(args.replay, 'recording_options', 'replay_file')
+        if args.replay_speed:
+            ConfigManager.set_config_value(args.replay_speed, 'recording_options', 'replay_speed')
+
     def initialize_components(self):
         """
         Initialize the components of the application.
         """
-        self.input_simulator = InputSimulator()
+        # Text is typed on its own thread, so the UI stays responsive and the next recording
+        # can start while the previous result is still being typed
+        max_pending_output = ConfigManager.get_config_value('post_processing', 'max_pending_output')
+        self.output_worker = OutputWorker(InputSimulator(), max_pending_output or 2000)
+        self.output_worker.start()
+        self.start_refiner()
 
         self.key_listener = KeyListener()
         self.key_listener.add_callback("on_activate", self.on_activation)
         self.key_listener.add_callback("on_deactivate", self.on_deactivation)
+        self.key_listener.add_callback("on_cancel", self.output_worker.cancel)
 
-        model_options = ConfigManager.get_config_section('model_options')
-        model_path = model_options.get('local', {}).get('model_path')
-        self.local_model = create_local_model() if not model_options.get('use_api') else None
+        self.engine = None
+        self.model_loader = None
+        self.model_loading = False
+        self.stale_model_loaders = []
+        self.pending_activation = None
+
+        self.audio_engine = None
+        self.start_audio_engine()
 
         self.result_thread = None
 
@@ -65,6 +116,65 @@ class WhisperWriterApp(QObject):
         self.create_tray_icon()
         self.main_window.show()
 
+        self.subscribe_to_config_changes()
+        self.load_model()
+
+    def load_model(self):
+        """
+        Load the transcription engine in the background, showing a loading state until it is ready.
+        """
+        self.model_loading = True
+        self.model_loader = ModelLoaderThread()
+        self.model_loader.modelLoaded.connect(self.on_model_loaded)
+        self.tray_icon.setToolTip('WhisperWriter (loading model...)')
+        if not ConfigManager.get_config_value('misc', 'hide_status_window'):
+            self.status_window.updateStatus('loading')
+        self.model_loader.start()
+
+    def on_model_loaded(self, engine):
+        """
+        Called when the transcription engine has been loaded. Starts a recording that was
+        requested while the engine was loading.
+        """
+        self.engine = engine
+        self.model_loading = False
+        self.tray_icon.setToolTip('WhisperWriter')
+        if not ConfigManager.get_config_value('misc', 'hide_status_window'):
+            self.status_window.updateStatus('idle')
+
+        if self.pending_activation is not None:
+            activation_time, self.pending_activation = self.pending_activation, None
+            self.start_result_thread(activation_time=activation_time)
+
+    def start_refiner(self):
+        """
+        Start refining typed transcriptions with the refine model in the background, if enabled.
+        """
+        refine_options = ConfigManager.get_config_section('model_options')['refine']
+        if refine_options.get('enabled'):
+            self.refiner = Refiner(self.output_worker, refine_options.get('max_pending') or 4)
+            self.refiner.start()
+
+    def start_audio_engine(self):
+        """
+        Open the audio engine shared by all recordings, unless each recording opens its own.
+
+        A replayed file always uses a shared engine, as the replay position is kept by its
+        source: a new engine would start the file from the beginning for every recording.
+        """
+        recording_options = ConfigManager.settings().recording_options
+        if recording_options.persistent_stream or recording_options.audio_source == 'file':
+            self.audio_engine = AudioEngine()
+            self.audio_engine.start()
+
+    def is_model_loading(self):
+        """
+        Check whether the transcription engine is still being loaded. Loading ends when
+        on_model_loaded() receives the engine, which can be a while after the loader thread
+        has finished, as the signal is queued for the main thread.
+        """
+        return self.model_loading
+
     def create_tray_icon(self):
         """
         Create the system tray icon and its context menu.
@@ -91,8 +201,18 @@ class WhisperWriterApp(QObject):
     def cleanup(self):
         if self.key_listener:
             self.key_listener.stop()
-        if self.input_simulator:
-            self.input_simulator.cleanup()
+        if self.refiner:
+            self.refiner.stop()
+        if self.output_worker:
+            self.output_worker.stop()
+        for loader in [self.model_loader] + self.stale_model_loaders:
+            if loader and loader.isRunning():
+                loader.wait()
+        if self.audio_engine:
+            self.audio_engine.stop()
+        if self.engine:
+            self.engine.close()
+        export_traces()
 
     def exit_app(self):
         """
@@ -101,11 +221,89 @@ class WhisperWriterApp(QObject):
         self.cleanup()
         QApplication.quit()
 
-    def restart_app(self):
-        """Restart the application to apply the new settings."""
-        self.cleanup()
-        QApplication.quit()
-        QProcess.startDetached(sys.executable, sys.argv)
+    def subscribe_to_config_changes(self):
+        """
+        Rebuild each component only when its own settings change. Settings that are not listed
+        here are read whenever they are used and take effect without rebuilding anything.
+        """
+        ConfigManager.subscribe(self.on_activation_key_changed,
+                                ('recording_options', 'activation_key'), ('post_processing', 'cancel_output_key'))
+        ConfigManager.subscribe(self.on_input_backend_changed, ('recording_options', 'input_backend'))
+        ConfigManager.subscribe(self.on_input_method_changed,
+                                ('post_processing', 'input_method'), ('post_processing', 'paste_backend'))
+        ConfigManager.subscribe(self.on_audio_settings_changed,
+                                *[('recording_options', key) for key in self.AUDIO_ENGINE_SETTINGS])
+        ConfigManager.subscribe(self.on_model_settings_changed, *self.MODEL_SETTINGS)
+        # The refine model uses the model settings as well, apart from the model name
+        ConfigManager.subscribe(self.on_refine_settings_changed, *self.MODEL_SETTINGS, ('model_options', 'refine'))
+        ConfigManager.subscribe(self.on_max_pending_output_changed, ('post_processing', 'max_pending_output'))
+        ConfigManager.subscribe(self.on_status_window_setting_changed, ('misc', 'hide_status_window'))
+        ConfigManager.subscribe(lambda changed: configure_tracing(),
+                                ('misc', 'tracing'), ('misc', 'trace_buffer_size'))
+
+    def apply_settings(self):
+        """
+        Apply saved settings. On the first run the components are initialized; afterwards only
+        the components whose settings changed are rebuilt.
+        """
+        if self.key_listener is None:
+            ConfigManager.apply_changes()
+            self.initialize_components()
+            return
+
+        changed = ConfigManager.apply_changes()
+        ConfigManager.console_print(f'Applied {len(changed)} changed settings.')
+
+    def on_activation_key_changed(self, changed):
+        self.key_listener.update_activation_keys()
+
+    def on_input_backend_changed(self, changed):
+        self.key_listener.update_backend()
+
+    def on_input_method_changed(self, changed):
+        self.output_worker.replace_input_simulator(InputSimulator())
+
+    def on_max_pending_output_changed(self, changed):
+        max_pending_output = ConfigManager.get_config_value('post_processing', 'max_pending_output')
+        self.output_worker.set_max_pending_chars(max_pending_output or 2000)
+
+    def on_audio_settings_changed(self, changed):
+        """Reopen the audio engine with the new recording settings."""
+        self.stop_result_thread()
+        if self.audio_engine:
+            self.audio_engine.stop()
+            self.audio_engine = None
+        self.start_audio_engine()
+
+    def on_model_settings_changed(self, changed):
+        """Reload the transcription engine with the new model settings."""
+        self.stop_result_thread()
+        self.pending_activation = None
+        loader = self.model_loader
+        if loader and loader.isRunning():
+            # Discard the engine that is being loaded with the old settings once it is ready
+            loader.modelLoaded.disconnect(self.on_model_loaded)
+            loader.modelLoaded.connect(lambda engine: engine and engine.close())
+            self.stale_model_loaders.append(loader)
+            loader.finished.connect(lambda: self.stale_model_loaders.remove(loader))
+        if self.engine:
+            self.engine.close()
+            self.engine = None
+        self.load_model()
+
+    def on_refine_settings_changed(self, changed):
+        """Restart refining with the new refine settings."""
+        if self.refiner:
+            self.refiner.stop()
+            self.refiner = None
+        self.start_refiner()
+
+    def on_status_window_setting_changed(self, changed):
+        if ConfigManager.get_config_value('misc', 'hide_status_window'):
+            if hasattr(self, 'status_window'):
+                self.status_window.hide()
+        elif not hasattr(self, 'status_window'):
+            self.status_window = StatusWindow()
 
     def on_settings_closed(self):
         """
@@ -123,34 +321,53 @@ class WhisperWriterApp(QObject):
         """
         Called when the activation key combination is pressed.
         """
+        if self.is_model_loading():
+            # Queue the activation until the model is ready; pressing again cancels it
+            if self.pending_activation is None:
+                ConfigManager.console_print('Model is still loading. Recording will start once it is ready.')
+                self.pending_activation = self.key_listener.event_time or time.time()
+            else:
+                self.pending_activation = None
+            return
+
         if self.result_thread and self.result_thread.isRunning():
-            recording_mode = ConfigManager.get_config_value('recording_options', 'recording_mode')
+            recording_mode = ConfigManager.settings().recording_options.recording_mode
             if recording_mode == 'press_to_toggle':
                 self.result_thread.stop_recording()
             elif recording_mode == 'continuous':
                 self.stop_result_thread()
             return
 
-        self.start_result_thread()
+        self.start_result_thread(activation_time=self.key_listener.event_time or time.time())
 
     def on_deactivation(self):
         """
         Called when the activation key combination is released.
         """
-        if ConfigManager.get_config_value('recording_options', 'recording_mode') == 'hold_to_record':
+        if ConfigManager.settings().recording_options.recording_mode == 'hold_to_record':
+            if self.pending_activation is not None:
+                ConfigManager.console_print('Activation key released before the model was loaded.')
+                self.pending_activation = None
             if self.result_thread and self.result_thread.isRunning():
                 self.result_thread.stop_recording()
 
-    def start_result_thread(self):
+    def start_result_thread(self, activation_time=None):
         """
         Start the result thread to record audio and transcribe it.
+
+        :param activation_time: time.time() timestamp of the activation key press, if any
         """
         if self.result_thread and self.result_thread.isRunning():
             return
 
-        self.result_thread = ResultThread(self.local_model)
+        # Text typed before this recording is not revised, also not by refinements of earlier ones
+        generation = self.output_worker.start_output()
+        refine = functools.partial(self.refiner.submit, generation=generation) if self.refiner else None
+        self.result_thread = ResultThread(self.engine, self.audio_engine, activation_time,
+                                          output=self.output_worker.submit, refine=refine)
         if not ConfigManager.get_config_value('misc', 'hide_status_window'):
             self.result_thread.statusSignal.connect(self.status_window.updateStatus)
+            self.result_thread.partialSignal.connect(self.status_window.updatePartial)
             self.status_window.closeSignal.connect(self.stop_result_thread)
         self.result_thread.resultSignal.connect(self.on_transcription_complete)
         self.result_thread.start()
@@ -162,16 +379,24 @@ class WhisperWriterApp(QObject):
         if self.result_thread and self.result_thread.isRunning():
             self.result_thread.stop()
 
+    def play_completion_sound(self):
+        with tracer.span('beep'):
+            AudioPlayer(os.path.join('assets', 'beep.wav')).play(block=True)
+
     def on_transcription_complete(self, result):
         """
-        When the transcription is complete, type the result and start listening for the activation key again.
+        When the transcription is complete, start listening for the activation key again. The
+        result thread has already queued the result for typing on the output worker.
         """
-        self.input_simulator.typewrite(result)
-
-        if ConfigManager.get_config_value('misc', 'noise_on_completion'):
-            AudioPlayer(os.path.join('assets', 'beep.wav')).play(block=True)
-
-        if ConfigManager.get_config_value('recording_options', 'recording_mode') == 'continuous':
+        settings = ConfigManager.settings()
+        if settings.misc.noise_on_completion:
+            # Played by the output worker once the result has been typed
+            self.output_worker.call(self.play_completion_sound)
+        self.output_worker.call(export_traces, cancellable=False)
+
+        if settings.recording_options.recording_mode == 'continuous':
+            # The result thread keeps recording in continuous mode; this only restarts it if it
+            # ended, e.g. after an error
             self.start_result_thread()
         else:
             self.key_listener.start()
@@ -0,0 +1,30 @@
+import traceback
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from engines import create_engine
+
+
+class ModelLoaderThread(QThread):
+    """
+    A thread class for loading the transcription engine in the background.
+
+    The engine is loaded and warmed up with a short inference on synthetic audio, so that
+    neither the application startup nor the first transcription is blocked by it.
+
+    Signals:
+        modelLoaded: Emits the loaded engine, or None if loading failed
+    """
+
+    modelLoaded = pyqtSignal(object)
+
+    def run(self):
+        """Main execution method for the thread."""
+        engine = None
+        try:
+            engine = create_engine()
+            engine.load()
+            engine.warm_up()
+        except Exception:
+            traceback.print_exc()
+            engine = None
+        self.modelLoaded.emit(engine)
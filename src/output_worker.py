@@ -0,0 +1,180 @@
+import collections
+import itertools
+import threading
+import traceback
+
+from tracing import tracer
+from utils import ConfigManager
+
+
+class OutputWorker:
+    """
+    Types text on a dedicated thread, so that neither the GUI nor recording waits for it.
+
+    Text is typed in the order it was submitted. Submitting blocks while more than
+    `max_pending_chars` characters are waiting, which slows down the producer (the
+    transcription thread) instead of letting untyped text pile up. Callbacks can be queued
+    behind the text, e.g. to play a sound once everything before them has been typed.
+    Revisions change the text typed since the last start_output() in place.
+    cancel() stops the text being typed and drops everything still waiting.
+    """
+
+    def __init__(self, input_simulator, max_pending_chars=2000):
+        """
+        Initialize the OutputWorker.
+
+        :param input_simulator: InputSimulator used to type the text
+        :param max_pending_chars: Number of waiting characters above which submit() blocks
+        """
+        self.input_simulator = input_simulator
+        self.max_pending_chars = max_pending_chars
+        self._items = collections.deque()
+        self._pending_chars = 0
+        self._condition = threading.Condition()
+        self._current_cancel = None
+        self._stopped = False
+        self._thread = None
+        self._output_generations = itertools.count(1)
+
+    def start(self):
+        """Start the worker thread."""
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Cancel any pending output, stop the worker thread and clean up the input simulator."""
+        with self._condition:
+            self._stopped = True
+            self._cancel_locked()
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.input_simulator.cleanup()
+
+    def set_max_pending_chars(self, max_pending_chars):
+        """Change the number of waiting characters above which submit() blocks."""
+        with self._condition:
+            self.max_pending_chars = max_pending_chars
+            # A higher limit can let blocked producers continue
+            self._condition.notify_all()
+
+    def submit(self, text, block=True):
+        """
+        Queue text to be typed.
+
+        :param text: Text to type
+        :param block: Wait while too many characters are pending
+        :return: False if the worker was stopped before the text could be queued
+        """
+        if not text:
+            return True
+        with self._condition:
+            while block and not self._stopped and self._pending_chars > self.max_pending_chars:
+                self._condition.wait()
+            if self._stopped:
+                return False
+            self._items.append((text, None, True))
+            self._pending_chars += len(text)
+            self._condition.notify_all()
+        return True
+
+    def revise(self, draft, text, generation):
+        """
+        Queue replacing `draft` in the output started by start_output() with `text`. Drafts are
+        revised in the order they were typed, see InputSimulator.revise_output(). Nothing is
+        changed if another output was started since, or if `draft` is not found, e.g. because
+        typing it was cancelled.
+
+        :param generation: Generation of the output the draft was typed in, from start_output()
+        :return: False if the worker was stopped before the revision could be queued
+        """
+        return self._queue_edit(text, lambda text, cancel_event:
+                                self.input_simulator.revise_output(draft, text, generation, cancel_event))
+
+    def _queue_edit(self, text, edit):
+        """Queue text that is typed by calling edit(text, cancel_event) instead of typewrite()."""
+        with self._condition:
+            if self._stopped:
+                return False
+            self._items.append((text, edit, True))
+            self._pending_chars += len(text)
+            self._condition.notify_all()
+        return True
+
+    def start_output(self):
+        """
+        Queue starting a new output, which later replacements cannot change.
+
+        :return: Generation of the new output, which identifies it in revise()
+        """
+        generation = next(self._output_generations)
+        self.call(lambda: self.input_simulator.start_output(generation), cancellable=False)
+        return generation
+
+    def call(self, callback, cancellable=True):
+        """
+        Queue a callback to run on the worker thread once everything queued before it is typed.
+
+        :param cancellable: Whether cancel() drops the callback if it has not run yet
+        """
+        with self._condition:
+            self._items.append((None, callback, cancellable))
+            self._condition.notify_all()
+
+    def replace_input_simulator(self, input_simulator):
+        """Switch to another InputSimulator once the text queued so far is typed."""
+        def replace():
+            previous, self.input_simulator = self.input_simulator, input_simulator
+            previous.cleanup()
+        self.call(replace, cancellable=False)
+
+    def cancel(self):
+        """Stop typing the current text and drop the cancellable items that are still queued."""
+        with self._condition:
+            self._cancel_locked()
+            self._condition.notify_all()
+
+    def _cancel_locked(self):
+        if self._current_cancel is not None:
+            self._current_cancel.set()
+        kept = collections.deque(item for item in self._items if not item[2])
+        dropped = len(self._items) - len(kept)
+        self._items = kept
+        # Only the text being typed is still pending; it is finished or abandoned shortly
+        self._pending_chars = 0
+        if dropped:
+            ConfigManager.console_print(f'Output cancelled, dropped {dropped} queued items.')
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._items and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                text, callback, _ = self._items.popleft()
+                # Consecutive texts are typed as one batch, which external tools take in one write
+                while (text is not None and callback is None and self._items and
+                       self._items[0][0] is not None and self._items[0][1] is None):
+                    text += self._items.popleft()[0]
+                cancel_event = self._current_cancel = threading.Event()
+
+            try:
+                if text is not None:
+                    with tracer.span('typing'):
+                        if callback is None:
+                            self.input_simulator.typewrite(text, cancel_event)
+                        else:
+                            callback(text, cancel_event)
+                else:
+                    callback()
+            except Exception:
+                traceback.print_exc()
+
+            with self._condition:
+                self._current_cancel = None
+                if text is not None and not cancel_event.is_set():
+                    self._pending_chars -= len(text)
+                self._condition.notify_all()
@@ -0,0 +1,116 @@
+import collections
+import threading
+import traceback
+
+from engines import create_engine
+from tracing import tracer
+from transcription import transcribe
+from utils import ConfigManager
+
+
+class Refiner:
+    """
+    Transcribes recordings again with a slower, more accurate engine on a background thread,
+    and revises the typed draft transcription in place where the refined one differs.
+
+    The refine engine is loaded on the worker thread, so that neither startup nor the draft
+    transcriptions wait for it. If recordings arrive faster than they can be refined, the
+    oldest waiting one is skipped, as revising text typed long ago is more disruptive than
+    useful. Every draft is passed to the output worker in order, also when it is skipped or
+    stays the same, so that the output worker can tell identical drafts apart.
+    """
+
+    def __init__(self, output_worker, max_pending=4):
+        """
+        Initialize the Refiner.
+
+        :param output_worker: OutputWorker that typed the drafts and revises them
+        :param max_pending: Number of recordings that may wait to be refined
+        """
+        self.output_worker = output_worker
+        self._jobs = collections.deque(maxlen=max_pending)
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread, which loads the refine engine first."""
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Drop the waiting recordings and stop the worker thread."""
+        with self._condition:
+            self._stopped = True
+            self._jobs.clear()
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def submit(self, audio_data, split_points, draft, generation):
+        """
+        Queue a recording to be refined.
+
+        :param audio_data: Recorded audio that was transcribed
+        :param split_points: Sample offsets the recording was split at for chunked transcription
+        :param draft: Post-processed transcription that was typed
+        :param generation: Generation of the output the draft was typed in, from
+                           OutputWorker.start_output()
+        """
+        if not draft.strip():
+            return
+        with self._condition:
+            if self._stopped:
+                return
+            if len(self._jobs) == self._jobs.maxlen:
+                ConfigManager.console_print('Refinement is falling behind, skipping the oldest recording.')
+                _, _, skipped_draft, skipped_generation = self._jobs.popleft()
+                self.output_worker.revise(skipped_draft, skipped_draft, skipped_generation)
+            self._jobs.append((audio_data, split_points, draft, generation))
+            self._condition.notify_all()
+
+    def _load_engine(self):
+        refine_options = ConfigManager.get_config_section('model_options')['refine']
+        ConfigManager.console_print(f"Loading refine model {refine_options.get('model')}...")
+        engine = create_engine(refine_options.get('engine'), refine_options.get('model'))
+        engine.load()
+        engine.warm_up()
+        ConfigManager.console_print('Refine model loaded.')
+        return engine
+
+    def _run(self):
+        try:
+            engine = self._load_engine()
+        except Exception:
+            traceback.print_exc()
+            ConfigManager.console_print('Cannot load the refine model, typed text will not be refined.')
+            with self._condition:
+                self._stopped = True
+                self._jobs.clear()
+            return
+
+        try:
+            while True:
+                with self._condition:
+                    while not self._jobs and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                    audio_data, split_points, draft, generation = self._jobs.popleft()
+
+                try:
+                    with tracer.span('refine'):
+                        refined = transcribe(audio_data, engine, split_points)
+                except Exception:
+                    traceback.print_exc()
+                    refined = draft
+
+                if self._stopped:
+                    return
+                if refined != draft:
+                    ConfigManager.console_print(f'Refined line: {refined}')
+                self.output_worker.revise(draft, refined, generation)
+        finally:
+            engine.close()
@@ -1,16 +1,22 @@
+import queue
+import threading
 import time
 import traceback
 import numpy as np
-import sounddevice as sd
 import tempfile
 import wave
-import webrtcvad
 from PyQt5.QtCore import QThread, QMutex, pyqtSignal
-from collections import deque
 from threading import Event
 
-from transcription import transcribe
+from audio_buffer import AudioBuffer
+from audio_engine import AudioEngine
+from audio_processing import compact_silence, find_split_points
+from streaming import StreamingTranscriber
+from tracing import tracer
+from engines import create_engine
+from transcription import transcribe, transcribe_streamed, post_process_transcription
 from utils import ConfigManager
+from vad import create_vad
 
 
 class ResultThread(QThread):
@@ -26,23 +32,53 @@ class ResultThread(QThread):
 
     Signals:
         statusSignal: Emits the current status of the thread (e.g., 'recording', 'transcribing', 'idle')
-        resultSignal: Emits the transcription result
+        resultSignal: Emits the transcription result, or the part of it that was not passed
+                      to the output yet when streaming output is enabled
+        partialSignal: Emits the partial transcription while recording, if streaming is enabled
     """
 
     statusSignal = pyqtSignal(str)
     resultSignal = pyqtSignal(str)
+    partialSignal = pyqtSignal(str)
 
-    def __init__(self, local_model=None):
+    # Window around the activation key press, relative to its timestamp, in which audio is not
+    # passed to VAD so that the sound of pressing the keys is not mistaken for voice. The audio
+    # itself is kept in the recording.
+    KEY_CLICK_WINDOW = (-0.1, 0.15)
+
+    # Audio around detected speech that is kept when compacting silence
+    SPEECH_PADDING_MS = 150
+
+    # Maximum number of recorded utterances waiting for transcription in continuous mode
+    PIPELINE_DEPTH = 4
+
+    def __init__(self, engine=None, audio_engine=None, activation_time=None, output=None, refine=None):
         """
         Initialize the ResultThread.
 
-        :param local_model: Local transcription model (if applicable)
+        :param engine: Loaded transcription engine, or None to load the configured one
+        :param audio_engine: Shared AudioEngine to record from. If not given, a temporary
+                             engine is opened for the duration of the recording. A replayed
+                             file needs a shared engine to continue where the last recording
+                             stopped.
+        :param activation_time: time.time() timestamp of the activation key press, if the
+                                recording was started by one
+        :param output: Callable receiving the text to type, in order, from this thread. It
+                       may block to slow down transcription. The signals are emitted either way.
+        :param refine: Callable receiving the audio data, split points and whole post-processed
+                       transcription of every utterance once it was output, to refine it
         """
         super().__init__()
-        self.local_model = local_model
+        self.engine = engine
+        self.audio_engine = audio_engine
+        self.activation_time = activation_time
+        self.output = output
+        self.refine = refine
         self.is_recording = False
         self.is_running = True
         self.sample_rate = None
+        self.streaming_transcriber = None
+        self.vad = None
         self.mutex = QMutex()
 
     def stop_recording(self):
@@ -65,13 +101,12 @@ class ResultThread(QThread):
             if not self.is_running:
                 return
 
-            self.mutex.lock()
-            self.is_recording = True
-            self.mutex.unlock()
+            if ConfigManager.get_config_value('recording_options', 'recording_mode') == 'continuous':
+                self._run_continuous()
+                return
 
             self.statusSignal.emit('recording')
-            ConfigManager.console_print('Recording...')
-            audio_data = self._record_audio()
+            audio_data, split_points, streaming_transcriber = self._capture_utterance()
 
             if not self.is_running:
                 return
@@ -81,21 +116,15 @@ class ResultThread(QThread):
                 return
 
             self.statusSignal.emit('transcribing')
-            ConfigManager.console_print('Transcribing...')
-
-            # Time the transcription process
-            start_time = time.time()
-            result = transcribe(audio_data, self.local_model)
-            end_time = time.time()
-
-            transcription_time = end_time - start_time
-            ConfigManager.console_print(f'Transcription completed in {transcription_time:.2f} seconds. Post-processed line: {result}')
+            result, transcription = self._transcribe_utterance(audio_data, split_points, streaming_transcriber)
 
             if not self.is_running:
                 return
 
             self.statusSignal.emit('idle')
-            self.resultSignal.emit(result)
+            self._emit_result(result)
+            if self.refine:
+                self.refine(audio_data, split_points, transcription)
 
         except Exception as e:
             traceback.print_exc()
@@ -104,74 +133,251 @@ class ResultThread(QThread):
         finally:
             self.stop_recording()
 
+    def _run_continuous(self):
+        """
+        Run continuous mode as a two-stage pipeline.
+
+        This thread keeps capturing utterances and hands them to a transcription worker through
+        a bounded queue, so speech is recorded while earlier utterances are still being
+        transcribed. Results are emitted in the order the utterances were spoken. Without a
+        shared audio engine, one is opened for the whole session, so that the device stays open
+        and no speech is lost between utterances.
+        """
+        owns_engine = self.audio_engine is None
+        if owns_engine:
+            self.audio_engine = AudioEngine()
+            self.audio_engine.start()
+
+        utterances = queue.Queue(maxsize=self.PIPELINE_DEPTH)
+        worker = threading.Thread(target=self._transcription_worker, args=(utterances,), daemon=True)
+        worker.start()
+
+        try:
+            self.statusSignal.emit('recording')
+            while self.is_running:
+                audio_data, split_points, streaming_transcriber = self._capture_utterance()
+                # Following utterances are not started by a key press
+                self.activation_time = None
+
+                if audio_data is None:
+                    continue
+                if not self.is_running:
+                    if streaming_transcriber:
+                        streaming_transcriber.cancel()
+                    break
+
+                if utterances.full():
+                    ConfigManager.console_print('Transcription is falling behind. Waiting before recording the next utterance.')
+                utterances.put((audio_data, split_points, streaming_transcriber))
+        finally:
+            if owns_engine:
+                self.audio_engine.stop()
+                self.audio_engine = None
+            utterances.put(None)
+            worker.join()
+
+    def _transcription_worker(self, utterances):
+        """Transcribe queued utterances in order until the end-of-stream marker is received."""
+        while True:
+            item = utterances.get()
+            if item is None:
+                break
+
+            audio_data, split_points, streaming_transcriber = item
+            if not self.is_running:
+                if streaming_transcriber:
+                    streaming_transcriber.cancel()
+                continue
+
+            try:
+                result, transcription = self._transcribe_utterance(audio_data, split_points, streaming_transcriber)
+            except Exception:
+                traceback.print_exc()
+                continue
+
+            if self.is_running:
+                self._emit_result(result)
+                if self.refine:
+                    self.refine(audio_data, split_points, transcription)
+
+    def _emit_result(self, result):
+        """Hand the result to the output, if any, and emit it."""
+        if self.output:
+            self.output(result)
+        self.resultSignal.emit(result)
+
+    def _capture_utterance(self):
+        """
+        Record a single utterance.
+
+        :return: Tuple of the audio data (or None if nothing usable was recorded), the sample
+                 offsets to split it at for chunked transcription (or None), and the
+                 streaming transcriber that followed the recording, if streaming is enabled
+        """
+        self.mutex.lock()
+        self.is_recording = True
+        self.mutex.unlock()
+
+        ConfigManager.console_print('Recording...')
+        if self.engine is None:
+            # Loading failed or was skipped; load the engine here as a last resort
+            self.engine = create_engine()
+            self.engine.load()
+        self.engine.prepare()
+        audio_data, split_points = self._record_audio()
+        streaming_transcriber, self.streaming_transcriber = self.streaming_transcriber, None
+
+        if streaming_transcriber and (audio_data is None or not self.is_running):
+            streaming_transcriber.cancel()
+            streaming_transcriber = None
+        return audio_data, split_points, streaming_transcriber
+
+    def _transcribe_utterance(self, audio_data, split_points=None, streaming_transcriber=None):
+        """
+        Transcribe a recorded utterance.
+
+        With streaming output, text is passed to the output while the engine produces segments,
+        and only the remainder is left as the result.
+
+        :return: Tuple of the post-processed result and the whole post-processed transcription
+        """
+        ConfigManager.console_print('Transcribing...')
+
+        # Time the transcription process
+        start_time = time.time()
+        output = []
+        if streaming_transcriber:
+            # Only the part of the recording that is not confirmed yet still has to be decoded
+            result = post_process_transcription(streaming_transcriber.finish(audio_data))
+        elif ConfigManager.get_config_value('post_processing', 'stream_output') and not split_points:
+            def emit_output(text):
+                output.append(text)
+                if self.output:
+                    self.output(text)
+            result = transcribe_streamed(audio_data, self.engine, emit_output)
+        else:
+            result = transcribe(audio_data, self.engine, split_points)
+        end_time = time.time()
+
+        transcription_time = end_time - start_time
+        transcription = ''.join(output) + result
+        ConfigManager.console_print(f'Transcription completed in {transcription_time:.2f} seconds. Post-processed line: {transcription}')
+        return result, transcription
+
     def _record_audio(self):
         """
         Record audio from the microphone and save it to a temporary file.
 
-        :return: numpy array of audio data, or None if the recording is too short
+        :return: Tuple of the numpy array of audio data (or None if the recording is too short)
+                 and the sample offsets to split it at for chunked transcription (or None)
         """
         recording_options = ConfigManager.get_config_section('recording_options')
-        self.sample_rate = recording_options.get('sample_rate') or 16000
-        frame_duration_ms = 30  # 30ms frame duration for WebRTC VAD
-        frame_size = int(self.sample_rate * (frame_duration_ms / 1000.0))
-        silence_duration_ms = recording_options.get('silence_duration') or 900
-        silence_frames = int(silence_duration_ms / frame_duration_ms)
+        audio_engine = self.audio_engine
+        owns_engine = audio_engine is None
+        if owns_engine:
+            audio_engine = AudioEngine()
+            audio_engine.start()
 
-        # 150ms delay before starting VAD to avoid mistaking the sound of key pressing for voice
-        initial_frames_to_skip = int(0.15 * self.sample_rate / frame_size)
+        self.sample_rate = audio_engine.sample_rate
 
         # Create VAD only for recording modes that use it
         recording_mode = recording_options.get('recording_mode') or 'continuous'
         vad = None
         if recording_mode in ('voice_activity_detection', 'continuous'):
-            vad = webrtcvad.Vad(2)  # VAD aggressiveness: 0 to 3, 3 being the most aggressive
-            speech_detected = False
-            silent_frame_count = 0
+            # Reuse the detector across the utterances of a continuous session
+            if self.vad is None or self.vad.sample_rate != self.sample_rate:
+                self.vad = create_vad(self.sample_rate)
+            vad = self.vad
+            vad.reset()
+        speech_detected = False
+        speech_end = None
+        silent_frame_count = 0
+
+        frame_duration_ms = vad.frame_duration_ms if vad else AudioEngine.FRAME_DURATION_MS
+        frame_size = int(self.sample_rate * frame_duration_ms / 1000)
+        batch_size = vad.batch_size if vad else 1
+        silence_duration_ms = recording_options.get('silence_duration') or 900
+        silence_frames = int(silence_duration_ms / frame_duration_ms)
+
+        # Ignore the key press window in VAD to avoid mistaking the sound of key pressing for voice
+        click_window = None
+        if self.activation_time is not None:
+            click_window = (self.activation_time + self.KEY_CLICK_WINDOW[0],
+                            self.activation_time + self.KEY_CLICK_WINDOW[1])
+        frame_duration = frame_duration_ms / 1000.0
 
-        audio_buffer = deque(maxlen=frame_size)
-        recording = []
+        # Preallocate room for 30 seconds; the buffer grows geometrically beyond that
+        recording = AudioBuffer(initial_capacity=self.sample_rate * 30, dtype=audio_engine.dtype)
+        speech_flags = AudioBuffer(initial_capacity=1000, dtype=bool)
+        processed = 0
+        endpoint_detected = False
 
         data_ready = Event()
+        attach_time = time.time()
 
-        def audio_callback(indata, frames, time, status):
-            if status:
-                ConfigManager.console_print(f"Audio callback status: {status}")
-            audio_buffer.extend(indata[:, 0])
+        def on_audio_block(samples):
+            if not len(recording):
+                tracer.record('first_frame', attach_time, time.time())
+            recording.append(samples)
             data_ready.set()
 
-        with sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
-                            blocksize=frame_size, device=recording_options.get('sound_device'),
-                            callback=audio_callback):
-            while self.is_running and self.is_recording:
-                data_ready.wait()
+        # Pre-roll only makes sense for key-triggered recordings; otherwise it would repeat the
+        # tail of the previous recording
+        start_time = audio_engine.attach(on_audio_block, pre_roll=self.activation_time is not None)
+        if ConfigManager.get_config_value('model_options', 'common', 'streaming'):
+            self.streaming_transcriber = StreamingTranscriber(
+                self.engine, self.sample_rate,
+                on_partial=lambda text: self.partialSignal.emit(text.strip()))
+            self.streaming_transcriber.start(lambda: recording.view(0, processed))
+        try:
+            while self.is_running and self.is_recording and not endpoint_detected:
+                # Wake up periodically so a stop request is honoured even without audio
+                if not data_ready.wait(timeout=0.1):
+                    continue
                 data_ready.clear()
 
-                if len(audio_buffer) < frame_size:
+                # Process every complete frame that arrived since the last wake-up as one batch
+                frame_count = (len(recording) - processed) // frame_size
+                if frame_count < batch_size:
                     continue
+                frames = recording.view(processed, processed + frame_count * frame_size).reshape(frame_count, frame_size)
+                frame_starts = start_time + (processed + np.arange(frame_count) * frame_size) / self.sample_rate
+                processed += frame_count * frame_size
 
-                # Save frame
-                frame = np.array(list(audio_buffer), dtype=np.int16)
-                audio_buffer.clear()
-                recording.extend(frame)
-
-                # Avoid trying to detect voice in initial frames
-                if initial_frames_to_skip > 0:
-                    initial_frames_to_skip -= 1
+                if not vad:
                     continue
 
-                if vad:
-                    if vad.is_speech(frame.tobytes(), self.sample_rate):
+                # Avoid trying to detect voice in frames overlapping the key press
+                ignored = np.zeros(frame_count, dtype=bool)
+                if click_window:
+                    ignored = (frame_starts < click_window[1]) & (frame_starts + frame_duration > click_window[0])
+
+                is_speech_batch = vad.is_speech_batch(frames)
+                speech_flags.append(is_speech_batch & ~ignored)
+
+                for is_speech, is_ignored, frame_start in zip(is_speech_batch, ignored, frame_starts):
+                    if is_ignored:
+                        continue
+                    if is_speech:
                         silent_frame_count = 0
+                        speech_end = frame_start + frame_duration
                         if not speech_detected:
                             ConfigManager.console_print("Speech detected.")
+                            tracer.record('speech_start', frame_start, time.time())
                             speech_detected = True
                     else:
                         silent_frame_count += 1
 
                     if speech_detected and silent_frame_count > silence_frames:
+                        tracer.record('endpoint', speech_end, time.time())
+                        endpoint_detected = True
                         break
+        finally:
+            audio_engine.detach(on_audio_block)
+            if owns_engine:
+                audio_engine.stop()
 
-        audio_data = np.array(recording, dtype=np.int16)
+        audio_data = recording.view()
         duration = len(audio_data) / self.sample_rate
 
         ConfigManager.console_print(f'Recording finished. Size: {audio_data.size} samples, Duration: {duration:.2f} seconds')
@@ -180,6 +386,29 @@ class ResultThread(QThread):
 
         if (duration * 1000) < min_duration_ms:
             ConfigManager.console_print(f'Discarded due to being too short.')
-            return None
-
-        return audio_data
+            return None, None
+
+        # Streaming transcription works on offsets into the uncompacted recording
+        if vad and recording_options.get('trim_silence') and not self.streaming_transcriber:
+            max_pause_ms = recording_options.get('max_pause_duration') or 0
+            audio_data = compact_silence(audio_data, speech_flags.view(), frame_size,
+                                         max_pause_frames=int(max_pause_ms / frame_duration_ms),
+                                         padding_frames=int(self.SPEECH_PADDING_MS / frame_duration_ms))
+            # Compact the VAD decisions the same way, so they stay aligned with the audio
+            speech_flags = compact_silence(speech_flags.view(), speech_flags.view(), 1,
+                                           max_pause_frames=int(max_pause_ms / frame_duration_ms),
+                                           padding_frames=int(self.SPEECH_PADDING_MS / frame_duration_ms))
+            ConfigManager.console_print(f'Compacted silence. Duration: {len(audio_data) / self.sample_rate:.2f} seconds')
+        else:
+            speech_flags = speech_flags.view()
+
+        # Split long recordings at pauses so that the chunks can be transcribed concurrently
+        split_points = None
+        common_options = ConfigManager.get_config_section('model_options')['common']
+        if vad and common_options.get('chunked_transcription') and not self.streaming_transcriber:
+            max_chunk_frames = int((common_options.get('max_chunk_duration') or 30) * 1000 / frame_duration_ms)
+            split_points = find_split_points(speech_flags, frame_size, max_chunk_frames) or None
+            if split_points:
+                ConfigManager.console_print(f'Split recording into {len(split_points) + 1} chunks.')
+
+        return audio_data, split_points
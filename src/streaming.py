@@ -0,0 +1,150 @@
+import threading
+import traceback
+
+from transcription import transcribe_segments
+from utils import ConfigManager
+
+
+class LocalAgreement:
+    """
+    Stable-prefix policy for incremental transcription.
+
+    Each hypothesis is a list of timed segments for the audio after the confirmed offset. A
+    segment is confirmed once two consecutive hypotheses agree on it, as long as it is not the
+    last segment of the newest hypothesis (which may still change as more audio arrives).
+    Confirmed audio is never decoded again: the offset moves to the end of the last confirmed
+    segment and only the audio after it is transcribed from then on.
+    """
+
+    def __init__(self):
+        """Initialize the LocalAgreement policy."""
+        self.confirmed = []
+        self.offset = 0.0
+        self._previous = []
+
+    @staticmethod
+    def _normalize(text):
+        return ' '.join(text.lower().split())
+
+    @property
+    def confirmed_text(self):
+        return ''.join(self.confirmed)
+
+    @property
+    def unconfirmed_text(self):
+        return ''.join(text for _, text in self._previous)
+
+    def update(self, segments):
+        """
+        Feed a new hypothesis and confirm the prefix it shares with the previous one.
+
+        :param segments: Segments transcribed from the audio starting at `offset`
+        :return: List of newly confirmed segment texts
+        """
+        current = [(self.offset + segment.end, segment.text) for segment in segments]
+
+        agreed = 0
+        for (_, previous_text), (_, current_text) in zip(self._previous, current[:-1]):
+            if self._normalize(previous_text) != self._normalize(current_text):
+                break
+            agreed += 1
+
+        newly_confirmed = [text for _, text in current[:agreed]]
+        if agreed:
+            self.confirmed.extend(newly_confirmed)
+            self.offset = current[agreed - 1][0]
+        self._previous = current[agreed:]
+        return newly_confirmed
+
+
+class StreamingTranscriber:
+    """
+    Transcribes a recording incrementally while it is still being captured.
+
+    A background thread periodically transcribes the unconfirmed part of the growing
+    recording and feeds the result to a LocalAgreement policy. Partial results (confirmed
+    text followed by the current unconfirmed hypothesis) are reported through a callback.
+    When the recording ends, only the audio after the last confirmed segment is decoded.
+    """
+
+    def __init__(self, engine, sample_rate, on_partial=None):
+        """
+        Initialize the StreamingTranscriber.
+
+        :param engine: Loaded transcription engine
+        :param sample_rate: Sample rate of the recorded audio
+        :param on_partial: Callable receiving the partial transcription text
+        """
+        common_options = ConfigManager.get_config_section('model_options', 'common')
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.on_partial = on_partial
+        self.interval = (common_options.get('streaming_interval') or 1000) / 1000.0
+        self.policy = LocalAgreement()
+        self._get_audio = None
+        self._decoded_until = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, get_audio):
+        """
+        Start transcribing in the background.
+
+        :param get_audio: Callable returning the audio recorded so far
+        """
+        self._get_audio = get_audio
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _prompt(self):
+        """Use the tail of the confirmed text to condition the next decode."""
+        initial_prompt = ConfigManager.get_config_value('model_options', 'common', 'initial_prompt') or ''
+        prompt = (initial_prompt + self.policy.confirmed_text)[-800:]
+        return prompt or None
+
+    def _decode(self, audio_data):
+        audio_data = audio_data[int(self.policy.offset * self.sample_rate):]
+        # Too little audio left after the confirmed offset to contain any speech
+        if len(audio_data) < self.sample_rate // 10:
+            return []
+        return transcribe_segments(audio_data, self.engine, self._prompt(), timestamps=True)
+
+    def _run(self):
+        interval_samples = int(self.interval * self.sample_rate)
+        while not self._stop_event.wait(self.interval):
+            audio_data = self._get_audio()
+            # Only decode again once enough new audio has arrived
+            if len(audio_data) - self._decoded_until < interval_samples:
+                continue
+            self._decoded_until = len(audio_data)
+
+            try:
+                segments = self._decode(audio_data)
+            except Exception:
+                traceback.print_exc()
+                continue
+            if self._stop_event.is_set():
+                break
+
+            self.policy.update(segments)
+            if self.on_partial:
+                self.on_partial(self.policy.confirmed_text + self.policy.unconfirmed_text)
+
+    def cancel(self):
+        """Stop background decoding and wait for an in-flight decode to finish."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def finish(self, audio_data):
+        """
+        Stop background decoding and transcribe the unconfirmed tail of the recording.
+
+        :param audio_data: The complete recording
+        :return: Full transcription text, without post-processing
+        """
+        self.cancel()
+        tail = ''.join(segment.text for segment in self._decode(audio_data))
+        return self.policy.confirmed_text + tail
@@ -0,0 +1,128 @@
+import collections
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+
+from utils import ConfigManager
+
+# Pipeline stages in the order they happen for an utterance
+STAGES = ('key_event', 'stream_open', 'first_frame', 'speech_start', 'endpoint', 'encode',
+          'network', 'inference', 'post_processing', 'typing', 'beep', 'refine')
+
+
+class LatencyTracer:
+    """
+    Records the duration of pipeline stages in an in-memory ring buffer.
+
+    Recording a span is a single append to a bounded deque, which is cheap and safe to call
+    from any thread, and does nothing while tracing is disabled. Spans can be exported as
+    JSON lines and summarized per stage in a Prometheus textfile.
+    """
+
+    def __init__(self, capacity=4096):
+        """
+        Initialize the LatencyTracer.
+
+        :param capacity: Maximum number of spans kept in memory
+        """
+        self.enabled = False
+        self.spans = collections.deque(maxlen=capacity)
+        self._sequence = itertools.count()
+        self._exported = -1
+
+    def configure(self, enabled, capacity):
+        """Enable or disable tracing and resize the ring buffer, keeping the newest spans."""
+        if capacity != self.spans.maxlen:
+            self.spans = collections.deque(self.spans, maxlen=capacity)
+        self.enabled = enabled
+
+    def record(self, stage, start, end):
+        """
+        Record a span.
+
+        :param stage: Name of the stage, one of STAGES
+        :param start: time.time() timestamp at which the stage started
+        :param end: time.time() timestamp at which the stage ended
+        """
+        if self.enabled:
+            self.spans.append((next(self._sequence), stage, start, end - start))
+
+    @contextmanager
+    def span(self, stage):
+        """Record the time spent in the `with` block as a span of `stage`."""
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.time())
+
+    def quantiles(self, quantiles=(0.5, 0.95)):
+        """
+        Summarize the spans in the buffer per stage.
+
+        :return: Dictionary of stage to (count, sum of durations, list of quantile values)
+        """
+        durations = collections.defaultdict(list)
+        for _, stage, _, duration in list(self.spans):
+            durations[stage].append(duration)
+        return {stage: (len(values), float(np.sum(values)), np.quantile(values, quantiles).tolist())
+                for stage, values in durations.items()}
+
+    def export_jsonl(self, path):
+        """Append the spans recorded since the last export to a JSON lines file."""
+        spans = [span for span in list(self.spans) if span[0] > self._exported]
+        if not spans:
+            return
+        with open(path, 'a') as file:
+            for _, stage, start, duration in spans:
+                file.write(json.dumps({'stage': stage, 'start': start, 'duration': duration}) + '\n')
+        self._exported = spans[-1][0]
+
+    def export_prometheus(self, path, quantiles=(0.5, 0.95)):
+        """
+        Write the per-stage latency quantiles as a Prometheus summary in the textfile format.
+
+        The file is replaced atomically, so a collector never reads a partial file.
+        """
+        lines = ['# HELP whisper_writer_stage_latency_seconds Latency of WhisperWriter pipeline stages.',
+                 '# TYPE whisper_writer_stage_latency_seconds summary']
+        for stage, (count, total, values) in sorted(self.quantiles(quantiles).items()):
+            for quantile, value in zip(quantiles, values):
+                lines.append(f'whisper_writer_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'whisper_writer_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'whisper_writer_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary_path, path)
+
+
+# Tracer shared by all components
+tracer = LatencyTracer()
+
+
+def configure_tracing():
+    """Apply the tracing settings from the configuration to the shared tracer."""
+    misc = ConfigManager.settings().misc
+    tracer.configure(bool(misc.tracing), misc.trace_buffer_size or 4096)
+
+
+def export_traces():
+    """Export the shared tracer's spans to the configured files, if tracing is enabled."""
+    if not tracer.enabled:
+        return
+    misc = ConfigManager.settings().misc
+    try:
+        if misc.trace_file:
+            tracer.export_jsonl(misc.trace_file)
+        if misc.metrics_file:
+            tracer.export_prometheus(misc.metrics_file)
+    except OSError as e:
+        ConfigManager.console_print(f'Error exporting traces: {e}')
@@ -1,25 +1,40 @@
-import io
 import os
+import re
+import threading
+import time
 import numpy as np
-import soundfile as sf
-# from faster_whisper import WhisperModel
-from openai import OpenAI
-# start enhancement for faster whisper api
-# from faster_whisper import WhisperModel
-from faster_whisper_api_proxy import WhisperModelApiProxy, set_proxy_paramters
-#import torch
-# end enhancement faster whisper api
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+from audio_encoding import encode_audio
+from tracing import tracer
 from utils import ConfigManager
 
-def create_local_model():
+# A transcribed piece of audio, with start and end times in seconds
+Segment = namedtuple('Segment', ['start', 'end', 'text'])
+
+# Seconds an idle API connection is kept open for reuse
+API_KEEPALIVE_EXPIRY = 60.0
+
+_api_client = None
+_api_client_key = None
+_api_http_client = None
+_api_client_lock = threading.Lock()
+_api_last_preconnect = float('-inf')
+
+def create_local_model(model_name=None):
     """
     Create a local model using the faster-whisper library.
+
+    :param model_name: Model to load instead of the configured model or model path
     """
+    from faster_whisper import WhisperModel
+
     ConfigManager.console_print('Creating local model...')
     local_model_options = ConfigManager.get_config_section('model_options')['local']
     compute_type = local_model_options['compute_type']
-    model_path = local_model_options.get('model_path')
+    model_path = None if model_name else local_model_options.get('model_path')
+    model_name = model_name or local_model_options['model']
 
     if compute_type == 'int8':
         device = 'cpu'
@@ -27,123 +42,360 @@ def create_local_model():
     else:
         device = local_model_options['device']
 
+    # Chunked transcription decodes several chunks at the same time, one per model worker
+    common_options = ConfigManager.get_config_section('model_options')['common']
+    num_workers = (common_options.get('chunk_workers') or 1) if common_options.get('chunked_transcription') else 1
+
     try:
         if model_path:
             ConfigManager.console_print(f'Loading model from: {model_path}')
             model = WhisperModel(model_path,
                                  device=device,
                                  compute_type=compute_type,
+                                 num_workers=num_workers,
                                  download_root=None)  # Prevent automatic download
-        elif local_model_options['faster_whisper_api_base_url']:
-            set_proxy_paramters( api_base=local_model_options['faster_whisper_api_base_url'])
-            model = WhisperModelApiProxy(local_model_options['model'],
-                                    device=local_model_options['device'],
-                                    compute_type=local_model_options['compute_type'])
-            ConfigManager.console_print(f"Using Faster Whisper API: {local_model_options['faster_whisper_api_base_url']}")
         else:
-            model = WhisperModel(local_model_options['model'],
+            model = WhisperModel(model_name,
                                  device=device,
-                                 compute_type=compute_type)
+                                 compute_type=compute_type,
+                                 num_workers=num_workers)
     except Exception as e:
         ConfigManager.console_print(f'Error initializing WhisperModel: {e}')
         ConfigManager.console_print('Falling back to CPU.')
-        model = WhisperModel(model_path or local_model_options['model'],
+        model = WhisperModel(model_path or model_name,
                              device='cpu',
                              compute_type=compute_type,
+                             num_workers=num_workers,
                              download_root=None if model_path else None)
 
     ConfigManager.console_print('Local model created.')
     return model
 
-def create_remote_model():
-
+def create_remote_model(model_name=None):
     """
-    Create a remote model using the faster-whisper library.
+    Create a remote model using the Faster Whisper API proxy.
+
+    :param model_name: Model to use instead of the configured model
     """
-    model_options = ConfigManager.get_config_section('model_options')
+    from faster_whisper_api_proxy import WhisperModelApiProxy, set_proxy_paramters
+
     ConfigManager.console_print('Creating remote model...')
-    local_model_options = model_options['local']
-    # start enhancement for faster whisper api
-    faster_whisper_api_base_url=local_model_options['faster_whisper_api_base_url']
-    if faster_whisper_api_base_url:
-        set_proxy_paramters( api_base=faster_whisper_api_base_url)
-        model = WhisperModelApiProxy(local_model_options['model'],
+    local_model_options = ConfigManager.get_config_section('model_options')['local']
+    faster_whisper_api_base_url = local_model_options['faster_whisper_api_base_url']
+    if not faster_whisper_api_base_url:
+        raise ValueError('faster_whisper_api_base_url is not set')
+
+    set_proxy_paramters(api_base=faster_whisper_api_base_url)
+    model = WhisperModelApiProxy(model_name or local_model_options['model'],
                                  device=local_model_options['device'],
                                  compute_type=local_model_options['compute_type'])
-        ConfigManager.console_print(f'Using Faster Whisper API: {faster_whisper_api_base_url}')
-    
+    ConfigManager.console_print(f'Using Faster Whisper API: {faster_whisper_api_base_url}')
     return model
 
-def transcribe_local(audio_data, local_model=None):
+def warm_up_local_model(local_model):
+    """
+    Run a short inference on synthetic audio, so that the lazy initialization inside the model
+    happens before the first real transcription.
+    """
+    ConfigManager.console_print('Warming up local model...')
+    sample_rate = ConfigManager.get_config_section('recording_options').get('sample_rate') or 16000
+    noise = np.random.default_rng(0).normal(0.0, 0.01, sample_rate).astype(np.float32)
+    transcribe_local(noise, local_model)
+    ConfigManager.console_print('Local model warmed up.')
+
+def transcribe_local(audio_data, local_model=None, initial_prompt=None):
     """
     Transcribe an audio file using a local model.
     """
+    return ''.join([segment.text for segment in transcribe_local_segments(audio_data, local_model, initial_prompt)])
+
+def transcribe_local_segments(audio_data, local_model=None, initial_prompt=None):
+    """
+    Transcribe an audio file using a local model and return its timed segments.
+
+    :param initial_prompt: Prompt to use instead of the configured initial prompt
+    """
+    return list(iter_local_segments(audio_data, local_model, initial_prompt))
+
+def iter_local_segments(audio_data, local_model=None, initial_prompt=None):
+    """
+    Transcribe an audio file using a local model, yielding timed segments as the model produces them.
+
+    :param initial_prompt: Prompt to use instead of the configured initial prompt
+    """
     if not local_model:
         local_model = create_local_model()
-    model_options = ConfigManager.get_config_section('model_options')
+    model_options = ConfigManager.settings().model_options
 
-    # Convert int16 to float32
-    audio_data_float = audio_data.astype(np.float32) / 32768.0
+    # Float32 recordings are passed to the model as they are, int16 ones are converted
+    if audio_data.dtype == np.float32:
+        audio_data_float = audio_data
+    else:
+        audio_data_float = audio_data.astype(np.float32) / 32768.0
 
+    start_time = time.time()
     response = local_model.transcribe(audio=audio_data_float,
-                                      language=model_options['common']['language'],
-                                      initial_prompt=model_options['common']['initial_prompt'],
-                                      condition_on_previous_text=model_options['local']['condition_on_previous_text'],
-                                      temperature=model_options['common']['temperature'],
-                                      vad_filter=model_options['local']['vad_filter'],)
-    return ''.join([segment.text for segment in list(response[0])])
+                                      language=model_options.common.language,
+                                      initial_prompt=initial_prompt or model_options.common.initial_prompt,
+                                      condition_on_previous_text=model_options.local.condition_on_previous_text,
+                                      temperature=model_options.common.temperature,
+                                      vad_filter=model_options.local.vad_filter,)
+    # Segments are decoded lazily while the generator is consumed
+    for segment in response[0]:
+        yield Segment(segment.start, segment.end, segment.text)
+    tracer.record('inference', start_time, time.time())
+
+def get_api_client():
+    """
+    Return the shared OpenAI client, creating it on first use and whenever the base URL or
+    API key changed. The client keeps a pool of keep-alive connections, so consecutive
+    transcriptions reuse the same TLS connection instead of setting up a new one.
+    """
+    global _api_client, _api_client_key, _api_http_client
+    import httpx
+    from openai import OpenAI
+
+    api_key = os.getenv('OPENAI_API_KEY') or None
+    base_url = ConfigManager.get_config_value('model_options', 'api', 'base_url') or 'https://api.openai.com/v1'
+    with _api_client_lock:
+        if _api_client is None or _api_client_key != (base_url, api_key):
+            if _api_http_client is not None:
+                _api_http_client.close()
+            _api_http_client = httpx.Client(limits=httpx.Limits(max_connections=8,
+                                                                max_keepalive_connections=4,
+                                                                keepalive_expiry=API_KEEPALIVE_EXPIRY))
+            _api_client = OpenAI(api_key=api_key, base_url=base_url, http_client=_api_http_client)
+            _api_client_key = (base_url, api_key)
+        return _api_client
+
+def preconnect_api():
+    """
+    Open a connection to the API endpoint in the background, so that the TLS handshake is
+    done while the user is still speaking. Does nothing if a connection was opened recently.
+    """
+    global _api_last_preconnect
+
+    now = time.monotonic()
+    if now - _api_last_preconnect < API_KEEPALIVE_EXPIRY / 2:
+        return
+    _api_last_preconnect = now
+
+    def connect():
+        client = get_api_client()
+        try:
+            _api_http_client.head(str(client.base_url))
+        except Exception as e:
+            ConfigManager.console_print(f'Could not pre-connect to the API: {e}')
+
+    threading.Thread(target=connect, daemon=True).start()
+
+def _request_api_transcription(audio_data, initial_prompt=None, model=None, **kwargs):
+    """
+    Send audio data to the OpenAI API and return the raw response.
+
+    :param model: Model to use instead of the configured API model
+    """
+    settings = ConfigManager.settings()
+    model_options = settings.model_options
+    client = get_api_client()
+
+    # Encode numpy array in the configured upload format
+    with tracer.span('encode'):
+        upload_file = encode_audio(audio_data, settings.recording_options.sample_rate or 16000,
+                                   upload_format=model_options.api.upload_format or 'wav',
+                                   bitrate=model_options.api.upload_bitrate or 24000)
+
+    with tracer.span('network'):
+        return client.audio.transcriptions.create(
+            model=model or model_options.api.model,
+            file=upload_file,
+            language=model_options.common.language,
+            prompt=initial_prompt or model_options.common.initial_prompt,
+            temperature=model_options.common.temperature,
+            **kwargs
+        )
 
-def transcribe_api(audio_data):
+def transcribe_api(audio_data, initial_prompt=None, model=None):
     """
     Transcribe an audio file using the OpenAI API.
+
+    :param model: Model to use instead of the configured API model
     """
-    model_options = ConfigManager.get_config_section('model_options')
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY') or None,
-        base_url=model_options['api']['base_url'] or 'https://api.openai.com/v1'
-    )
+    return _request_api_transcription(audio_data, initial_prompt, model).text
 
-    # Convert numpy array to WAV file
-    byte_io = io.BytesIO()
-    sample_rate = ConfigManager.get_config_section('recording_options').get('sample_rate') or 16000
-    sf.write(byte_io, audio_data, sample_rate, format='wav')
-    byte_io.seek(0)
-
-    response = client.audio.transcriptions.create(
-        model=model_options['api']['model'],
-        file=('audio.wav', byte_io, 'audio/wav'),
-        language=model_options['common']['language'],
-        prompt=model_options['common']['initial_prompt'],
-        temperature=model_options['common']['temperature'],
-    )
-    return response.text
+def transcribe_api_segments(audio_data, initial_prompt=None, model=None):
+    """
+    Transcribe an audio file using the OpenAI API and return its timed segments.
+
+    This requests the verbose_json response format, which not every endpoint and model
+    supports, so it is only used where segment times are needed. Endpoints that do not return
+    segments yield a single segment covering the whole audio.
+
+    :param model: Model to use instead of the configured API model
+    """
+    response = _request_api_transcription(audio_data, initial_prompt, model, response_format='verbose_json')
+    segments = getattr(response, 'segments', None) or []
+    if not segments:
+        sample_rate = ConfigManager.get_config_section('recording_options').get('sample_rate') or 16000
+        return [Segment(0.0, len(audio_data) / sample_rate, response.text)]
+
+    def field(segment, name):
+        return segment[name] if isinstance(segment, dict) else getattr(segment, name)
+
+    return [Segment(field(segment, 'start'), field(segment, 'end'), field(segment, 'text')) for segment in segments]
 
 def post_process_transcription(transcription):
     """
     Apply post-processing to the transcription.
     """
     transcription = transcription.strip()
-    post_processing = ConfigManager.get_config_section('post_processing')
-    if post_processing['remove_trailing_period'] and transcription.endswith('.'):
+    post_processing = ConfigManager.settings().post_processing
+    if post_processing.remove_trailing_period and transcription.endswith('.'):
         transcription = transcription[:-1]
-    if post_processing['add_trailing_space']:
+    if post_processing.add_trailing_space:
         transcription += ' '
-    if post_processing['remove_capitalization']:
+    if post_processing.remove_capitalization:
         transcription = transcription.lower()
 
     return transcription
 
-def transcribe(audio_data, local_model=None):
+class IncrementalPostProcessor:
+    """
+    Applies the same post-processing as post_process_transcription to text that arrives in
+    pieces, so that each piece can be typed as soon as it is transcribed.
+
+    Trailing whitespace, and a trailing period if it is to be removed, are held back until
+    more text arrives, because they can only be handled once it is known whether they end
+    the transcription. The concatenation of everything returned by feed() and finish() is
+    equal to post_process_transcription() of the concatenated input.
+    """
+
+    def __init__(self):
+        """Initialize the IncrementalPostProcessor."""
+        self.post_processing = ConfigManager.settings().post_processing
+        held_back = r'\.?\s*$' if self.post_processing.remove_trailing_period else r'\s*$'
+        self._held_back = re.compile(held_back)
+        self._pending = ''
+        self._started = False
+
+    def _finalize(self, text):
+        return text.lower() if self.post_processing.remove_capitalization else text
+
+    def feed(self, text):
+        """
+        Add a piece of transcribed text.
+
+        :return: Post-processed text that is safe to output now, possibly empty
+        """
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        self._pending += text
+        split = self._held_back.search(self._pending).start()
+        ready, self._pending = self._pending[:split], self._pending[split:]
+        return self._finalize(ready)
+
+    def finish(self):
+        """
+        End the transcription.
+
+        :return: Post-processed remainder of the text
+        """
+        text, self._pending = self._pending.rstrip(), ''
+        if self.post_processing.remove_trailing_period and text.endswith('.'):
+            text = text[:-1]
+        if self.post_processing.add_trailing_space:
+            text += ' '
+        return self._finalize(text)
+
+def transcribe_segments(audio_data, engine=None, initial_prompt=None, timestamps=False):
+    """
+    Transcribe audio data into timed segments with the given or configured transcription engine.
+    No post-processing is applied.
+
+    :param timestamps: Request accurate segment times from engines that do not return them
+                       by default
+    """
+    if engine is None:
+        engine = _create_default_engine()
+    if timestamps:
+        return engine.transcribe_timed(audio_data, initial_prompt)
+    return engine.transcribe(audio_data, initial_prompt)
+
+def transcribe_chunks(audio_data, split_points, engine=None, workers=2):
     """
-    Transcribe audio date using the OpenAI API or a local model, depending on config.
+    Transcribe a long recording as separate chunks, several at a time, and stitch the segments
+    back together in order. No post-processing is applied.
+
+    Chunks are decoded in rounds of `workers` chunks. Every chunk of a round is prompted with
+    the text of the chunk just before the round, which is the closest preceding text that is
+    known when the round starts.
+
+    :param split_points: Sample offsets to split the recording at, in increasing order
+    :param workers: Number of chunks transcribed at the same time
+    :return: List of Segment with times relative to the start of the recording
+    """
+    if engine is None:
+        engine = _create_default_engine()
+    sample_rate = ConfigManager.get_config_section('recording_options').get('sample_rate') or 16000
+    bounds = list(zip([0] + list(split_points), list(split_points) + [len(audio_data)]))
+
+    segments = []
+    prompt = ConfigManager.get_config_value('model_options', 'common', 'initial_prompt')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for round_start in range(0, len(bounds), workers):
+            round_bounds = bounds[round_start:round_start + workers]
+            futures = [executor.submit(engine.transcribe, audio_data[start:end], prompt)
+                       for start, end in round_bounds]
+            for (start, _), future in zip(round_bounds, futures):
+                offset = start / sample_rate
+                chunk_segments = future.result()
+                segments.extend(Segment(segment.start + offset, segment.end + offset, segment.text)
+                                for segment in chunk_segments)
+            # Whisper only looks at the end of long prompts
+            prompt = ''.join(segment.text for segment in chunk_segments)[-800:] or prompt
+    return segments
+
+def transcribe(audio_data, engine=None, split_points=None):
+    """
+    Transcribe audio data with the given or configured transcription engine and post-process it.
+
+    :param split_points: Sample offsets to split a long recording at for chunked transcription
     """
     if audio_data is None:
         return ''
 
-    if ConfigManager.get_config_value('model_options', 'use_api'):
-        transcription = transcribe_api(audio_data)
+    if split_points:
+        workers = ConfigManager.get_config_value('model_options', 'common', 'chunk_workers') or 2
+        segments = transcribe_chunks(audio_data, split_points, engine, workers)
     else:
-        transcription = transcribe_local(audio_data, local_model)
+        segments = transcribe_segments(audio_data, engine)
+    transcription = ''.join(segment.text for segment in segments)
+    with tracer.span('post_processing'):
+        return post_process_transcription(transcription)
+
+def transcribe_streamed(audio_data, engine=None, on_output=None):
+    """
+    Transcribe audio data and pass post-processed text to `on_output` as soon as each segment
+    is produced by the engine.
+
+    :param on_output: Callable receiving each non-empty piece of post-processed text
+    :return: The post-processed remainder that was not passed to `on_output`
+    """
+    if engine is None:
+        engine = _create_default_engine()
+
+    post_processor = IncrementalPostProcessor()
+    for segment in engine.stream(audio_data):
+        text = post_processor.feed(segment.text)
+        if text and on_output:
+            on_output(text)
+    return post_processor.finish()
 
-    return post_process_transcription(transcription)
+def _create_default_engine():
+    """Create and load the engine selected in the configuration, for callers that did not pass one."""
+    from engines import create_engine
 
+    engine = create_engine()
+    engine.load()
+    return engine
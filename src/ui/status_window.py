@@ -83,10 +83,23 @@ class StatusWindow(BaseWindow):
         elif status == 'transcribing':
             self.icon_label.setPixmap(self.pencil_pixmap)
             self.status_label.setText('Transcribing...')
+        elif status == 'loading':
+            self.icon_label.setPixmap(self.pencil_pixmap)
+            self.status_label.setText('Loading model...')
+            self.show()
 
         if status in ('idle', 'error', 'cancel'):
             self.close()
 
+    @pyqtSlot(str)
+    def updatePartial(self, text):
+        """
+        Show the end of the partial transcription while recording.
+        """
+        if text:
+            metrics = self.status_label.fontMetrics()
+            self.status_label.setText(metrics.elidedText(text, Qt.ElideLeft, self.width() - 80))
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -1,6 +1,12 @@
+import copy
 import yaml
 import os
 
+from config_snapshot import compile_schema, build_snapshot
+
+# Use the C YAML parser when PyYAML was built with libyaml
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class ConfigManager:
     _instance = None
 
@@ -8,6 +14,10 @@ class ConfigManager:
         """Initialize the ConfigManager instance."""
         self.config = None
         self.schema = None
+        self.applied_config = None
+        self.subscribers = []
+        self.snapshot_type = None
+        self.snapshot = None
 
     @classmethod
     def initialize(cls, schema_path=None):
@@ -17,6 +27,10 @@ class ConfigManager:
             cls._instance.schema = cls._instance.load_config_schema(schema_path)
             cls._instance.config = cls._instance.load_default_config()
             cls._instance.load_user_config()
+            cls._instance.applied_config = copy.deepcopy(cls._instance.config)
+            cls._instance.snapshot_type = compile_schema(cls._instance.schema)
+            cls._instance.snapshot = build_snapshot(cls._instance.snapshot_type, cls._instance.config,
+                                                    warn=cls.console_print)
 
     @classmethod
     def get_schema(cls):
@@ -25,6 +39,19 @@ class ConfigManager:
             raise RuntimeError("ConfigManager not initialized")
         return cls._instance.schema
 
+    @classmethod
+    def settings(cls):
+        """
+        Get an immutable snapshot of the applied configuration with attribute access, e.g.
+        ConfigManager.settings().post_processing.add_trailing_space.
+
+        The snapshot is replaced as a whole when changes are applied, so code that holds on to
+        it sees consistent values, unaffected by edits in the settings window until they are saved.
+        """
+        if cls._instance is None:
+            raise RuntimeError("ConfigManager not initialized")
+        return cls._instance.snapshot
+
     @classmethod
     def get_config_section(cls, *keys):
         """Get a specific section of the configuration."""
@@ -76,7 +103,7 @@ class ConfigManager:
             schema_path = os.path.join(base_dir, 'config_schema.yaml')
 
         with open(schema_path, 'r') as file:
-            schema = yaml.safe_load(file)
+            schema = yaml.load(file, Loader=YamlLoader)
         return schema
 
     def load_default_config(self):
@@ -106,7 +133,7 @@ class ConfigManager:
         if config_path and os.path.isfile(config_path):
             try:
                 with open(config_path, 'r') as file:
-                    user_config = yaml.safe_load(file)
+                    user_config = yaml.load(file, Loader=YamlLoader) or {}
                     deep_update(self.config, user_config)
             except yaml.YAMLError:
                 print("Error in configuration file. Using default configuration.")
@@ -129,6 +156,48 @@ class ConfigManager:
         cls._instance.config = cls._instance.load_default_config()
         cls._instance.load_user_config()
 
+    @classmethod
+    def subscribe(cls, callback, *sections):
+        """
+        Register a callback to be notified when settings in the given sections change.
+
+        Sections are tuples of nested keys, e.g. ('recording_options', 'activation_key') or
+        ('model_options',). The callback receives the set of changed key paths within them.
+        """
+        if cls._instance is None:
+            raise RuntimeError("ConfigManager not initialized")
+        cls._instance.subscribers.append((callback, tuple(sections)))
+
+    @classmethod
+    def apply_changes(cls):
+        """
+        Compare the configuration with the one that was last applied and notify the subscribers
+        of the sections that changed.
+
+        :return: Set of changed key paths
+        """
+        if cls._instance is None:
+            raise RuntimeError("ConfigManager not initialized")
+
+        def diff(old, new, path=()):
+            if isinstance(old, dict) and isinstance(new, dict):
+                changed = set()
+                for key in old.keys() | new.keys():
+                    changed |= diff(old.get(key), new.get(key), path + (key,))
+                return changed
+            return set() if old == new else {path}
+
+        changed = diff(cls._instance.applied_config, cls._instance.config)
+        cls._instance.applied_config = copy.deepcopy(cls._instance.config)
+        cls._instance.snapshot = build_snapshot(cls._instance.snapshot_type, cls._instance.applied_config,
+                                                warn=cls.console_print)
+
+        for callback, sections in list(cls._instance.subscribers):
+            matching = {path for path in changed if any(path[:len(section)] == section for section in sections)}
+            if matching:
+                callback(matching)
+        return changed
+
     @classmethod
     def config_file_exists(cls):
         """Check if a valid config file exists."""
@@ -138,5 +207,12 @@ class ConfigManager:
     @classmethod
     def console_print(cls, message):
         """Print a message to the console if enabled in the configuration."""
-        if cls._instance and cls._instance.config['misc']['print_to_terminal']:
+        if cls._instance is None:
+            return
+        if cls._instance.snapshot is not None:
+            print_to_terminal = cls._instance.snapshot.misc.print_to_terminal
+        else:
+            # While the first snapshot is being built
+            print_to_terminal = cls.get_config_value('misc', 'print_to_terminal')
+        if print_to_terminal:
             print(message)
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+from utils import ConfigManager
+
+
+class VoiceActivityDetector(ABC):
+    """
+    Abstract base class for voice activity detectors.
+
+    Detectors classify fixed-size frames of audio as speech or non-speech. Frames are int16, or
+    float32 in the range [-1, 1] when capturing in float32. They are passed as a 2-D array of
+    shape (frame_count, frame_size), which is a zero-copy view into the recording buffer, so
+    detectors that benefit from it can score many frames at once.
+    """
+
+    # Frame length in milliseconds the detector works on
+    frame_duration_ms = 30
+
+    # Number of frames worth collecting before calling is_speech_batch
+    batch_size = 1
+
+    def __init__(self, sample_rate):
+        """
+        Initialize the detector.
+
+        :param sample_rate: Sample rate of the audio in Hz
+        """
+        self.sample_rate = sample_rate
+
+    @property
+    def frame_size(self):
+        """Number of samples per frame."""
+        return int(self.sample_rate * self.frame_duration_ms / 1000)
+
+    @abstractmethod
+    def is_speech_batch(self, frames) -> np.ndarray:
+        """
+        Classify frames as speech or non-speech.
+
+        :param frames: int16 or float32 array of shape (frame_count, frame_size)
+        :return: Boolean array of length frame_count
+        """
+        pass
+
+    def reset(self):
+        """Reset any internal state before a new recording."""
+        pass
+
+
+class WebRtcVad(VoiceActivityDetector):
+    """
+    Voice activity detector using the WebRTC VAD.
+    """
+
+    frame_duration_ms = 30
+
+    def __init__(self, sample_rate, aggressiveness=2):
+        """
+        Initialize the WebRTC VAD.
+
+        :param sample_rate: Sample rate of the audio in Hz
+        :param aggressiveness: 0 to 3, 3 being the most aggressive in filtering out non-speech
+        """
+        import webrtcvad
+        super().__init__(sample_rate)
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech_batch(self, frames):
+        if frames.dtype != np.int16:
+            frames = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        return np.fromiter((self.vad.is_speech(frame.tobytes(), self.sample_rate) for frame in frames),
+                           dtype=bool, count=len(frames))
+
+
+class SileroVad(VoiceActivityDetector):
+    """
+    Voice activity detector running a Silero VAD ONNX model with onnxruntime.
+
+    The model is recurrent, so the frames of a batch are scored one after another with the
+    state carried from each frame to the next, exactly as if they arrived one at a time. A
+    batch only saves the wake-ups in between. Both the v4 (separate h/c state) and v5 (single
+    state plus context) model signatures are supported.
+    """
+
+    # Silero expects 512-sample windows at 16 kHz (256 at 8 kHz)
+    frame_duration_ms = 32
+
+    def __init__(self, sample_rate, model_path, threshold=0.5):
+        """
+        Initialize the Silero VAD.
+
+        :param sample_rate: Sample rate of the audio in Hz, 8000 or 16000
+        :param model_path: Path to the Silero VAD ONNX model
+        :param threshold: Speech probability above which a frame counts as speech
+        """
+        import onnxruntime
+        if sample_rate not in (8000, 16000):
+            raise ValueError(f'Silero VAD supports 8000 or 16000 Hz, not {sample_rate}')
+        super().__init__(sample_rate)
+        self.threshold = threshold
+
+        options = onnxruntime.SessionOptions()
+        options.inter_op_num_threads = 1
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                    providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.is_v5 = 'state' in self.input_names
+        self.context_size = 64 if sample_rate == 16000 else 32
+        self.reset()
+
+    def reset(self):
+        if self.is_v5:
+            self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        else:
+            self.state = (np.zeros((2, 1, 64), dtype=np.float32), np.zeros((2, 1, 64), dtype=np.float32))
+        self.context = np.zeros(self.context_size, dtype=np.float32)
+
+    def is_speech_batch(self, frames):
+        batch = len(frames)
+        if batch == 0:
+            return np.zeros(0, dtype=bool)
+
+        audio = frames if frames.dtype == np.float32 else frames.astype(np.float32) / 32768.0
+        sr = np.array(self.sample_rate, dtype=np.int64)
+
+        probabilities = np.empty(batch, dtype=np.float32)
+        for index, window in enumerate(audio):
+            if self.is_v5:
+                # v5 models expect each window to be preceded by the tail of the previous one
+                model_input = np.concatenate((self.context, window))[None, :]
+                output, self.state = self.session.run(None, {'input': model_input, 'state': self.state, 'sr': sr})
+            else:
+                h, c = self.state
+                output, h, c = self.session.run(None, {'input': window[None, :], 'sr': sr, 'h': h, 'c': c})
+                self.state = (h, c)
+            self.context = window[-self.context_size:].copy()
+            probabilities[index] = np.asarray(output).reshape(-1)[0]
+        return probabilities > self.threshold
+
+
+def create_vad(sample_rate):
+    """
+    Create the voice activity detector selected in the configuration.
+
+    Falls back to the WebRTC VAD if the Silero model cannot be loaded.
+    """
+    recording_options = ConfigManager.get_config_section('recording_options')
+    backend = recording_options.get('vad_backend') or 'webrtc'
+
+    if backend == 'silero':
+        model_path = recording_options.get('vad_model_path')
+        threshold = recording_options.get('vad_threshold') or 0.5
+        try:
+            if not model_path:
+                raise ValueError('vad_model_path is not set')
+            return SileroVad(sample_rate, model_path, threshold)
+        except Exception as e:
+            ConfigManager.console_print(f'Error initializing Silero VAD: {e}')
+            ConfigManager.console_print('Falling back to WebRTC VAD.')
+
+    return WebRtcVad(sample_rate)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+# Allow importing pynput without a display; tests replace the keyboard before typing
+os.environ.setdefault('PYNPUT_BACKEND', 'dummy')
+
+from utils import ConfigManager
+
+
+@pytest.fixture
+def config():
+    """
+    Initialize the ConfigManager with the default configuration and return a function that
+    sets and applies a configuration value, e.g. config(True, 'post_processing', 'stream_output').
+    The changed values are restored after the test.
+    """
+    ConfigManager.initialize()
+    changed = []
+
+    def set_value(value, *keys):
+        changed.append((ConfigManager.get_config_value(*keys), keys))
+        ConfigManager.set_config_value(value, *keys)
+        ConfigManager.apply_changes()
+
+    yield set_value
+
+    for value, keys in reversed(changed):
+        ConfigManager.set_config_value(value, *keys)
+    ConfigManager.apply_changes()
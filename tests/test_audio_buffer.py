@@ -0,0 +1,48 @@
+import numpy as np
+
+from audio_buffer import RingBuffer
+
+
+def test_read_returns_samples_written_so_far():
+    buffer = RingBuffer(5)
+    buffer.write(np.array([1, 2, 3], dtype=np.int16))
+    assert len(buffer) == 3
+    assert list(buffer.read()) == [1, 2, 3]
+
+
+def test_overwrites_oldest_samples_in_order():
+    buffer = RingBuffer(5)
+    for start in range(0, 12, 3):
+        buffer.write(np.arange(start, start + 3, dtype=np.int16))
+    assert len(buffer) == 5
+    assert list(buffer.read()) == [7, 8, 9, 10, 11]
+
+
+def test_write_longer_than_capacity_keeps_the_end():
+    buffer = RingBuffer(4)
+    buffer.write(np.array([1], dtype=np.int16))
+    buffer.write(np.arange(10, dtype=np.int16))
+    assert list(buffer.read()) == [6, 7, 8, 9]
+
+
+def test_read_returns_a_copy():
+    buffer = RingBuffer(3)
+    buffer.write(np.array([1, 2], dtype=np.int16))
+    buffer.read()[:] = 0
+    assert list(buffer.read()) == [1, 2]
+
+
+def test_zero_capacity_keeps_nothing():
+    buffer = RingBuffer(0)
+    buffer.write(np.array([1, 2], dtype=np.int16))
+    assert len(buffer) == 0
+    assert len(buffer.read()) == 0
+
+
+def test_clear():
+    buffer = RingBuffer(3, dtype=np.float32)
+    buffer.write(np.ones(5, dtype=np.float32))
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.write(np.array([0.5], dtype=np.float32))
+    assert list(buffer.read()) == [0.5]
@@ -0,0 +1,90 @@
+import numpy as np
+
+from audio_processing import PolyphaseResampler, compact_silence, find_split_points
+
+
+def frames(flags, frame_size=2):
+    """Return audio whose samples are numbered, with one frame per flag."""
+    return np.arange(len(flags) * frame_size)
+
+
+def kept_frames(audio, frame_size=2):
+    return list(audio[::frame_size] // frame_size)
+
+
+def test_compact_silence_without_speech_returns_input():
+    audio = frames([0, 0, 0])
+    assert compact_silence(audio, [False] * 3, 2, max_pause_frames=1) is audio
+
+
+def test_compact_silence_strips_leading_and_trailing_silence():
+    flags = [0, 0, 1, 1, 0, 0]
+    result = compact_silence(frames(flags), flags, 2, max_pause_frames=4)
+    assert kept_frames(result) == [2, 3]
+
+
+def test_compact_silence_shortens_pauses_keeping_the_edges():
+    flags = [1, 0, 0, 0, 0, 0, 1]
+    result = compact_silence(frames(flags), flags, 2, max_pause_frames=2)
+    assert kept_frames(result) == [0, 1, 5, 6]
+
+
+def test_compact_silence_keeps_short_pauses():
+    flags = [1, 0, 0, 1]
+    audio = frames(flags)
+    assert compact_silence(audio, flags, 2, max_pause_frames=2) is audio
+
+
+def test_compact_silence_pads_speech():
+    flags = [0, 0, 0, 1, 0, 0, 0]
+    result = compact_silence(frames(flags), flags, 2, max_pause_frames=0, padding_frames=1)
+    assert kept_frames(result) == [2, 3, 4]
+
+
+def test_find_split_points_short_recording_is_not_split():
+    assert find_split_points([True] * 10, 160, max_chunk_frames=10) == []
+
+
+def test_find_split_points_splits_in_the_middle_of_a_pause():
+    flags = np.ones(15, dtype=bool)
+    flags[6:9] = False
+    assert find_split_points(flags, 160, max_chunk_frames=10) == [7 * 160]
+
+
+def test_find_split_points_ignores_pauses_in_the_first_half():
+    flags = np.ones(15, dtype=bool)
+    flags[2:4] = False
+    assert find_split_points(flags, 160, max_chunk_frames=10) == [10 * 160]
+
+
+def test_find_split_points_without_pauses_splits_at_the_maximum_length():
+    assert find_split_points([True] * 25, 1, max_chunk_frames=10) == [10, 20]
+
+
+def tone(frequency, sample_rate, duration=0.5):
+    return np.sin(2 * np.pi * frequency * np.arange(int(sample_rate * duration)) / sample_rate).astype(np.float32)
+
+
+def test_resampler_output_length():
+    resampler = PolyphaseResampler(48000, 16000)
+    assert len(resampler.process(np.zeros(4800, dtype=np.float32))) == 1600
+    resampler = PolyphaseResampler(44100, 16000)
+    assert sum(len(resampler.process(np.zeros(441, dtype=np.float32))) for _ in range(100)) == 16000
+
+
+def test_resampler_does_not_depend_on_block_size():
+    audio = tone(440, 44100)
+    whole = PolyphaseResampler(44100, 16000).process(audio).copy()
+    resampler = PolyphaseResampler(44100, 16000)
+    blocks = [resampler.process(audio[start:start + 333]).copy() for start in range(0, len(audio), 333)]
+    np.testing.assert_allclose(np.concatenate(blocks), whole, atol=1e-5)
+
+
+def test_resampler_passes_speech_band_and_removes_aliases():
+    resampler = PolyphaseResampler(48000, 16000)
+    passed = resampler.process(tone(1000, 48000))[400:]
+    assert abs(np.sqrt(np.mean(passed ** 2)) - np.sqrt(0.5)) < 0.01
+
+    resampler = PolyphaseResampler(48000, 16000)
+    aliased = resampler.process(tone(12000, 48000))[400:]
+    assert np.sqrt(np.mean(aliased ** 2)) < 0.01
@@ -0,0 +1,31 @@
+import numpy as np
+
+import transcription
+from engines import create_engine
+
+
+class FakeResponse:
+    def __init__(self, text, segments=None):
+        self.text = text
+        self.segments = segments
+
+
+def test_openai_engine_requests_segment_times_only_when_needed(config, monkeypatch):
+    requests = []
+
+    def request(audio_data, initial_prompt=None, model=None, **kwargs):
+        requests.append(kwargs)
+        return FakeResponse(' Hello world.', [{'start': 0.0, 'end': 0.5, 'text': ' Hello'},
+                                              {'start': 0.5, 'end': 1.0, 'text': ' world.'}])
+
+    monkeypatch.setattr(transcription, '_request_api_transcription', request)
+    config(16000, 'recording_options', 'sample_rate')
+    engine = create_engine('openai')
+    audio = np.zeros(32000, dtype=np.int16)
+
+    assert engine.transcribe(audio) == [transcription.Segment(0.0, 2.0, ' Hello world.')]
+    assert requests.pop() == {}
+
+    segments = engine.transcribe_timed(audio)
+    assert [segment.end for segment in segments] == [0.5, 1.0]
+    assert requests.pop() == {'response_format': 'verbose_json'}
@@ -0,0 +1,210 @@
+import sys
+import threading
+
+import pytest
+from pynput.keyboard import Key
+
+from input_simulation import InputSimulator
+
+
+class FakeKeyboard:
+    """pynput keyboard that applies key presses to a text field."""
+
+    def __init__(self):
+        self.text = ''
+        self.presses = []
+
+    def press(self, key):
+        self.presses.append(key)
+        self.text = self.text[:-1] if key == Key.backspace else self.text + key
+
+    def release(self, key):
+        pass
+
+
+class FakeUInput:
+    """uinput device that records the key events written to it."""
+
+    def __init__(self, events=None, name=None):
+        self.events = []
+
+    def write(self, event_type, code, value):
+        self.events.append((code, value))
+
+    def syn(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeClipboard:
+    """pyperclip replacement holding the clipboard text in memory."""
+
+    def __init__(self):
+        self.text = ''
+
+    def copy(self, text):
+        self.text = text
+
+    def paste(self):
+        return self.text
+
+
+@pytest.fixture
+def simulator(config):
+    config('pynput', 'post_processing', 'input_method')
+    config(0.0, 'post_processing', 'writing_key_press_delay')
+    simulator = InputSimulator()
+    simulator.keyboard = FakeKeyboard()
+    simulator.start_output(1)
+    return simulator
+
+
+def test_replace_output_types_only_the_difference(simulator):
+    simulator.typewrite('Hello world. ')
+    simulator.keyboard.presses.clear()
+
+    simulator.replace_output('Hello there. ')
+
+    assert simulator.keyboard.text == simulator.output == 'Hello there. '
+    assert simulator.keyboard.presses == [Key.backspace] * 7 + list('there. ')
+
+
+def test_replace_output_extending_the_output_does_not_erase(simulator):
+    simulator.typewrite('Hello')
+    simulator.replace_output('Hello world')
+    assert Key.backspace not in simulator.keyboard.presses
+    assert simulator.keyboard.text == 'Hello world'
+
+
+def test_replace_output_leaves_earlier_outputs_alone(simulator):
+    simulator.typewrite('First. ')
+    simulator.start_output(2)
+    simulator.typewrite('Second. ')
+    simulator.replace_output('Other. ')
+    assert simulator.keyboard.text == 'First. Other. '
+
+
+def test_revise_output_replaces_the_draft_and_retypes_what_follows(simulator):
+    simulator.typewrite('Their here. ')
+    simulator.typewrite('Next. ')
+
+    assert simulator.revise_output('Their here. ', "They're here. ", 1)
+    assert simulator.keyboard.text == simulator.output == "They're here. Next. "
+
+
+def test_revise_output_tells_identical_drafts_apart(simulator):
+    simulator.typewrite('go. ')
+    simulator.typewrite('go. ')
+
+    assert simulator.revise_output('go. ', 'Go. ', 1)
+    assert simulator.revise_output('go. ', 'Go! ', 1)
+    assert simulator.keyboard.text == 'Go. Go! '
+
+
+def test_revise_output_drops_drafts_of_an_earlier_output(simulator):
+    simulator.typewrite('Yes. ')
+    simulator.start_output(2)
+    simulator.typewrite('Yes. ')
+
+    assert not simulator.revise_output('Yes. ', 'No. ', 1)
+    assert simulator.keyboard.text == 'Yes. Yes. '
+    assert simulator.revise_output('Yes. ', 'Yes! ', 2)
+    assert simulator.keyboard.text == 'Yes. Yes! '
+
+
+def test_revise_output_without_the_draft_changes_nothing(simulator):
+    simulator.typewrite('Hello. ')
+    assert not simulator.revise_output('Goodbye. ', 'Bye. ', 1)
+    assert not simulator.revise_output('Hello. ', 'Hi. ', None)
+    assert simulator.keyboard.text == 'Hello. '
+
+
+@pytest.fixture
+def uinput_simulator(config, monkeypatch):
+    # evdev is Linux-only and optional
+    evdev = pytest.importorskip('evdev')
+    monkeypatch.setattr(evdev, 'UInput', FakeUInput)
+    config('uinput', 'post_processing', 'input_method')
+    config(0.0, 'post_processing', 'uinput_report_delay')
+    simulator = InputSimulator()
+    assert simulator.key_method == 'uinput'
+    simulator.start_output(1)
+    return simulator
+
+
+def pressed_keys(simulator):
+    ecodes = simulator.uinput.evdev.ecodes
+    return [ecodes.KEY[code] for code, value in simulator.uinput.device.events if value]
+
+
+def test_uinput_output_leaves_out_characters_without_a_key(uinput_simulator):
+    uinput_simulator.typewrite('Ab é')
+
+    assert uinput_simulator.output == 'Ab '
+    assert uinput_simulator.uinput.dropped_characters == 1
+    assert uinput_simulator.typed_characters == 3
+    assert pressed_keys(uinput_simulator) == ['KEY_LEFTSHIFT', 'KEY_A', 'KEY_B', 'KEY_SPACE']
+
+
+def test_uinput_releases_every_key(uinput_simulator):
+    uinput_simulator.typewrite('Hello, World!')
+    held = set()
+    for code, value in uinput_simulator.uinput.device.events:
+        (held.add if value else held.discard)(code)
+    assert not held
+
+
+def test_uinput_replace_output_erases_with_backspace(uinput_simulator):
+    uinput_simulator.typewrite('Ab ')
+    uinput_simulator.uinput.device.events.clear()
+
+    uinput_simulator.replace_output('Ac ')
+
+    assert uinput_simulator.output == 'Ac '
+    assert pressed_keys(uinput_simulator) == ['KEY_BACKSPACE', 'KEY_BACKSPACE', 'KEY_C', 'KEY_SPACE']
+
+
+@pytest.fixture
+def clipboard(monkeypatch):
+    clipboard = FakeClipboard()
+    monkeypatch.setitem(sys.modules, 'pyperclip', clipboard)
+    return clipboard
+
+
+@pytest.fixture
+def paste_simulator(config, clipboard):
+    config('paste', 'post_processing', 'input_method')
+    config('pynput', 'post_processing', 'paste_backend')
+    config(60.0, 'post_processing', 'paste_restore_delay')
+    simulator = InputSimulator()
+    simulator.pasted = []
+    simulator._send_shortcut = lambda shortcut: simulator.pasted.append(clipboard.text)
+    yield simulator
+    simulator.cleanup()
+
+
+def test_paste_restores_the_clipboard(paste_simulator, clipboard):
+    clipboard.text = 'original'
+    paste_simulator.typewrite('Hello. ')
+
+    assert paste_simulator.pasted == ['Hello. ']
+    paste_simulator.cleanup()
+    assert clipboard.text == 'original'
+
+
+def test_paste_ignores_a_restore_timer_replaced_by_a_later_paste(paste_simulator, clipboard):
+    clipboard.text = 'original'
+    paste_simulator.typewrite('First. ')
+    paste_simulator.typewrite('Second. ')
+
+    # A timer of the first paste that fired, but only got the lock after the second paste
+    stale_restore = threading.Thread(target=paste_simulator._restore_clipboard, kwargs={'scheduled': True})
+    stale_restore.start()
+    stale_restore.join()
+
+    assert clipboard.text == 'Second. '
+    assert paste_simulator.pasted == ['First. ', 'Second. ']
+    paste_simulator.cleanup()
+    assert clipboard.text == 'original'
@@ -0,0 +1,48 @@
+import pytest
+
+import key_listener
+
+
+class FakeBackend:
+    """Input backend that only counts how many times it is listening."""
+
+    def __init__(self):
+        self.listeners = 0
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def start(self):
+        self.listeners += 1
+
+    def stop(self):
+        self.listeners = 0
+
+
+class FakeEvdevBackend(FakeBackend):
+    pass
+
+
+class FakePynputBackend(FakeBackend):
+    pass
+
+
+@pytest.fixture
+def listener(config, monkeypatch):
+    monkeypatch.setattr(key_listener, 'EvdevBackend', FakeEvdevBackend)
+    monkeypatch.setattr(key_listener, 'PynputBackend', FakePynputBackend)
+    config('pynput', 'recording_options', 'input_backend')
+    return key_listener.KeyListener()
+
+
+@pytest.mark.parametrize('input_backend, selected', [('auto', FakeEvdevBackend), ('evdev', FakeEvdevBackend)])
+def test_update_backend_stops_the_previous_backend(listener, config, input_backend, selected):
+    evdev_backend, pynput_backend = listener.backends
+    assert (evdev_backend.listeners, pynput_backend.listeners) == (0, 1)
+
+    config(input_backend, 'recording_options', 'input_backend')
+    listener.update_backend()
+
+    assert isinstance(listener.active_backend, selected)
+    assert (evdev_backend.listeners, pynput_backend.listeners) == (1, 0)
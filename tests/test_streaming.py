@@ -0,0 +1,51 @@
+from streaming import LocalAgreement
+from transcription import Segment
+
+
+def test_first_hypothesis_confirms_nothing():
+    agreement = LocalAgreement()
+    assert agreement.update([Segment(0.0, 1.0, ' Hello'), Segment(1.0, 2.0, ' world')]) == []
+    assert agreement.confirmed_text == ''
+    assert agreement.unconfirmed_text == ' Hello world'
+
+
+def test_agreeing_prefix_is_confirmed_except_the_last_segment():
+    agreement = LocalAgreement()
+    agreement.update([Segment(0.0, 1.0, ' Hello'), Segment(1.0, 2.0, ' world')])
+    confirmed = agreement.update([Segment(0.0, 1.0, ' Hello'), Segment(1.0, 2.0, ' world'),
+                                  Segment(2.0, 3.0, ' again')])
+    assert confirmed == [' Hello', ' world']
+    assert agreement.offset == 2.0
+    assert agreement.unconfirmed_text == ' again'
+
+
+def test_last_segment_is_never_confirmed():
+    agreement = LocalAgreement()
+    agreement.update([Segment(0.0, 1.0, ' Hello')])
+    assert agreement.update([Segment(0.0, 1.0, ' Hello')]) == []
+
+
+def test_agreement_ignores_case_and_whitespace():
+    agreement = LocalAgreement()
+    agreement.update([Segment(0.0, 1.0, ' hello'), Segment(1.0, 2.0, ' there')])
+    assert agreement.update([Segment(0.0, 1.0, ' Hello '), Segment(1.0, 2.0, ' world')]) == [' Hello ']
+
+
+def test_disagreement_stops_confirmation():
+    agreement = LocalAgreement()
+    agreement.update([Segment(0.0, 1.0, ' Hello'), Segment(1.0, 2.0, ' word'), Segment(2.0, 3.0, ' is')])
+    confirmed = agreement.update([Segment(0.0, 1.0, ' Hello'), Segment(1.0, 2.0, ' world'),
+                                  Segment(2.0, 3.0, ' is')])
+    assert confirmed == [' Hello']
+    assert agreement.offset == 1.0
+
+
+def test_later_hypotheses_are_relative_to_the_offset():
+    agreement = LocalAgreement()
+    agreement.update([Segment(0.0, 1.0, ' One'), Segment(1.0, 2.0, ' two')])
+    agreement.update([Segment(0.0, 1.0, ' One'), Segment(1.0, 2.0, ' two')])
+    assert agreement.offset == 1.0
+    confirmed = agreement.update([Segment(0.0, 1.0, ' two'), Segment(1.0, 1.5, ' three')])
+    assert confirmed == [' two']
+    assert agreement.offset == 2.0
+    assert agreement.confirmed_text == ' One two'
@@ -0,0 +1,35 @@
+import itertools
+
+import pytest
+
+from transcription import IncrementalPostProcessor, post_process_transcription
+
+PIECES = [
+    [' Hello world.'],
+    [' Hello', ' world', '.'],
+    ['', ' ', ' Hello.', ' World.', '  '],
+    [' Version 2.', '0 is out.', ' '],
+    [' Wait...', ' What?'],
+    [],
+]
+
+
+@pytest.mark.parametrize('remove_trailing_period, add_trailing_space, remove_capitalization',
+                         list(itertools.product([False, True], repeat=3)))
+@pytest.mark.parametrize('pieces', PIECES)
+def test_matches_post_process_transcription(config, pieces, remove_trailing_period, add_trailing_space,
+                                            remove_capitalization):
+    config(remove_trailing_period, 'post_processing', 'remove_trailing_period')
+    config(add_trailing_space, 'post_processing', 'add_trailing_space')
+    config(remove_capitalization, 'post_processing', 'remove_capitalization')
+
+    processor = IncrementalPostProcessor()
+    output = ''.join(processor.feed(piece) for piece in pieces) + processor.finish()
+    assert output == post_process_transcription(''.join(pieces))
+
+
+def test_holds_back_only_what_may_end_the_transcription(config):
+    config(True, 'post_processing', 'remove_trailing_period')
+    processor = IncrementalPostProcessor()
+    assert processor.feed(' Hello world. ') == 'Hello world'
+    assert processor.feed('Again') == '. Again'